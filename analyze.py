@@ -1,12 +1,105 @@
+import hashlib
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 
-def plot_candidate_radar(df, candidate_name):
-    categories = ['Trục Năng lực', 'Trục Phù hợp Văn hóa', 'Trục Tương lai', 'Tiêu chí khác', 'Điểm cộng', 'Điểm trừ']
-    candidate_data = df[df['Tên ứng viên'] == candidate_name][categories].values[0]
+RENAME_COLUMNS = {
+    'Điểm tổng quát soft skill' : 'Điểm tổng quát theo tiêu chí', 
+    'Điểm tổng quát hard skill':'Điểm tổng quát theo CV', 
+    'Trục Năng lực soft skill':'Trục Năng lực', 
+    'Trục Phù hợp Văn hóa soft skill':'Trục Phù hợp Văn hóa', 
+    'Trục Tương lai soft skill':'Trục Tương lai', 
+    'Tiêu chí khác soft skill':'Tiêu chí khác', 
+    'Điểm cộng soft skill': 'Điểm cộng', 
+    'Điểm trừ soft skill': 'Điểm trừ',
+    'Vị trí' : 'Vị trí tương ứng',
+    'Mức độ phù hợp hard skill': 'Mức độ phù hợp', 
+    'Kỹ năng kỹ thuật hard skill': 'Kỹ năng kỹ thuật', 
+    'Kinh nghiệm hard skill' : 'Kinh nghiệm', 
+    'Trình độ học vấn hard skill' : 'Trình độ học vấn', 
+    'Kỹ năng mềm hard skill' : 'Kỹ năng mềm',
+    'Tóm tắt hard skill': 'Tóm tắt theo CV',
+    'Tóm tắt soft skill': 'Tóm tắt theo tiêu chí',
+    'Đánh giá soft skill': 'Đánh giá theo tiêu chí'
+}
+# Cột có ít giá trị khác nhau: lưu dạng category để lọc/đếm nhanh và tốn ít bộ nhớ
+CATEGORICAL_COLUMNS = ['Vị trí tương ứng', 'Đánh giá theo tiêu chí', 'Trạng thái']
+RADAR_CATEGORIES = ['Trục Năng lực', 'Trục Phù hợp Văn hóa', 'Trục Tương lai', 'Tiêu chí khác', 'Điểm cộng', 'Điểm trừ']
+# Chế độ 'tiered': ứng viên chỉ chấm nhanh ở tầng 1 có điểm ước lượng và kết luận "Pass (tầng 1)"/"Fail (tầng 1)"
+ESTIMATE_COLUMN = 'Điểm ước lượng tầng 1'
+EVALUATION_COLORS = {"Pass": "green", "Fail": "red", "Pass (tầng 1)": "lightgreen", "Fail (tầng 1)": "lightsalmon"}
+# Cột Dashboard dùng đến (tên trong file kết quả); các cột khác như token, cache không được đọc
+DASHBOARD_COLUMNS = (['Mã ứng viên', 'Tên ứng viên', 'Email', 'Mức lương mong muốn', 'Trạng thái', 'Link CV']
+                     + list(RENAME_COLUMNS) + [ESTIMATE_COLUMN])
+
+def at_least(scores, minimum):
+    # Ứng viên chưa có điểm (VD: chỉ chấm nhanh ở tầng 1 của chế độ 'tiered') chỉ bị loại khi đặt ngưỡng > 0
+    return (scores >= minimum) | (scores.isna() & (minimum <= 0))
+
+def prepare_dataset(df):
+    import pandas as pd
+    df = df.rename(columns=RENAME_COLUMNS)
+    # File Parquet đã giữ kiểu số; chỉ CSV mới cần làm sạch lại
+    if not pd.api.types.is_numeric_dtype(df['Mức lương mong muốn']):
+        df['Mức lương mong muốn'] = pd.to_numeric(df['Mức lương mong muốn'].astype(str).str.replace(r'[^\d.]', ''), errors='coerce')
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    return df
+
+@st.cache_resource(max_entries=4, show_spinner="Đang đọc dữ liệu...")
+def load_dataset(file_hash, _uploaded_file):
+    # Đọc và chuẩn hóa một lần cho mỗi file (theo hash nội dung); mọi lần rerun sau dùng lại kết quả.
+    # Kết quả dùng chung giữa các lần rerun nên không được sửa trực tiếp.
+    from results_io import read_results
+    df = prepare_dataset(read_results(_uploaded_file, columns=DASHBOARD_COLUMNS))
+    # Chỉ mục tên ứng viên -> vị trí dòng đầu tiên có tên đó, theo thứ tự xuất hiện
+    names = df['Tên ứng viên'].astype(str)
+    first = ~names.duplicated()
+    candidate_index = dict(zip(names[first], first.to_numpy().nonzero()[0].tolist()))
+    return df, candidate_index
+
+TOP_POSITIONS = ['Tư vấn', 'Quản lý', 'Nhân viên', 'Thực tập sinh']
+TABLE_PAGE_SIZE = 500  # Số dòng gửi xuống trình duyệt cho mỗi trang bảng
+
+@st.cache_resource(max_entries=4)
+def summarize_dataset(file_hash, _df):
+    # Số liệu cho biểu đồ được gom sẵn một lần cho mỗi file: biểu đồ chỉ nhận vài dòng đã đếm
+    # thay vì toàn bộ ứng viên, nên dữ liệu gửi xuống trình duyệt không tăng theo số ứng viên
+    evaluation_counts = _df['Đánh giá theo tiêu chí'].value_counts().rename_axis('Đánh giá theo tiêu chí').reset_index(name='Số lượng ứng viên')
+    position_counts = (_df.groupby(['Vị trí tương ứng', 'Đánh giá theo tiêu chí'], observed=True).size()
+                       .reset_index(name='Số lượng ứng viên'))
+    # Top 5 mỗi vị trí trong một lượt groupby + nlargest, không sắp xếp toàn bộ bảng cho từng vị trí
+    top = {}
+    for score in ['Điểm tổng quát theo tiêu chí', 'Điểm tổng quát theo CV']:
+        values = _df[score]
+        if score == 'Điểm tổng quát theo tiêu chí' and ESTIMATE_COLUMN in _df.columns:
+            # Ứng viên chỉ chấm ở tầng 1 được xếp theo điểm ước lượng
+            values = values.fillna(_df[ESTIMATE_COLUMN])
+        labels = values.groupby(_df['Vị trí tương ứng'], observed=True).nlargest(5).index.get_level_values(-1)
+        top[score] = _df.loc[labels]
+    return evaluation_counts, position_counts, top
+
+def paginate(df, key, page_size=TABLE_PAGE_SIZE):
+    # Bảng lớn chỉ gửi một trang mỗi lần
+    pages = max(1, -(-len(df) // page_size))
+    if pages == 1:
+        return df
+    page = st.number_input(f"Trang (1-{pages})", min_value=1, max_value=pages, value=1, key=key)
+    st.caption(f"Hiển thị dòng {(page - 1) * page_size + 1}-{min(page * page_size, len(df))} / {len(df)}")
+    return df.iloc[(page - 1) * page_size:page * page_size]
+
+def uploaded_file_hash(uploaded_file):
+    # Băm nội dung một lần cho mỗi lần tải lên (file_id), không băm lại ở mỗi lần rerun
+    key = f"dashboard_hash_{uploaded_file.file_id}"
+    if key not in st.session_state:
+        st.session_state[key] = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    return st.session_state[key]
+
+def plot_candidate_radar(candidate_data):
+    import plotly.graph_objects as go
+    categories = RADAR_CATEGORIES
+    candidate_name = candidate_data['Tên ứng viên']
+    candidate_data = candidate_data[categories].values
 
     fig = go.Figure()
 
@@ -39,30 +132,15 @@ def plot_candidate_radar(df, candidate_name):
 def dashboard():
     st.header("📈 Dashboard Phân tích Ứng viên")
     
-    uploaded_file = st.file_uploader("Tải lên file CSV đã tải xuống từ tab 'Đánh giá CV'", type="csv")
+    uploaded_file = st.file_uploader("Tải lên file CSV hoặc Parquet đã tải xuống từ tab 'Đánh giá CV'", type=["csv", "parquet"])
 
     if uploaded_file is not None:
-        df = pd.read_csv(uploaded_file)
-        df.rename(columns={
-                'Điểm tổng quát soft skill' : 'Điểm tổng quát theo tiêu chí', 
-                'Điểm tổng quát hard skill':'Điểm tổng quát theo CV', 
-                'Trục Năng lực soft skill':'Trục Năng lực', 
-                'Trục Phù hợp Văn hóa soft skill':'Trục Phù hợp Văn hóa', 
-                'Trục Tương lai soft skill':'Trục Tương lai', 
-                'Tiêu chí khác soft skill':'Tiêu chí khác', 
-                'Điểm cộng soft skill': 'Điểm cộng', 
-                'Điểm trừ soft skill': 'Điểm trừ',
-                'Vị trí' : 'Vị trí tương ứng',
-                'Mức độ phù hợp hard skill': 'Mức độ phù hợp', 
-                'Kỹ năng kỹ thuật hard skill': 'Kỹ năng kỹ thuật', 
-                'Kinh nghiệm hard skill' : 'Kinh nghiệm', 
-                'Trình độ học vấn hard skill' : 'Trình độ học vấn', 
-                'Kỹ năng mềm hard skill' : 'Kỹ năng mềm',
-                'Tóm tắt hard skill': 'Tóm tắt theo CV',
-                'Tóm tắt soft skill': 'Tóm tắt theo tiêu chí',
-                'Đánh giá soft skill': 'Đánh giá theo tiêu chí'
-            }, inplace=True)
-        df['Mức lương mong muốn'] = pd.to_numeric(df['Mức lương mong muốn'].astype(str).str.replace(r'[^\d.]', ''), errors='coerce')
+        # pandas/plotly chỉ được nạp khi có file: tab Dashboard được dựng ở mọi lần chạy script
+        import plotly.express as px
+        import plotly.graph_objects as go
+        file_hash = uploaded_file_hash(uploaded_file)
+        df, candidate_index = load_dataset(file_hash, uploaded_file)
+        evaluation_counts, position_counts, top_candidates = summarize_dataset(file_hash, df)
         
         st.header("📊 Thông tin tổng quan")
         col1, col2, col3, col4 = st.columns(4)
@@ -74,21 +152,22 @@ def dashboard():
         st.header("🎭 Phân tích Đánh giá theo tiêu chí")
         col1, col2 = st.columns(2)
         with col1:
-            fig_pass_fail = px.pie(df, names="Đánh giá theo tiêu chí", title="Tỷ lệ ứng viên theo Đánh giá theo tiêu chí",
-                                   color="Đánh giá theo tiêu chí", color_discrete_map={"Pass": "green", "Fail": "red"})
+            fig_pass_fail = px.pie(evaluation_counts, names="Đánh giá theo tiêu chí", values="Số lượng ứng viên",
+                                   title="Tỷ lệ ứng viên theo Đánh giá theo tiêu chí",
+                                   color="Đánh giá theo tiêu chí", color_discrete_map=EVALUATION_COLORS)
             st.plotly_chart(fig_pass_fail, use_container_width=True)
         with col2:
-            fig_pass_fail_position = px.bar(df, x="Vị trí tương ứng", color="Đánh giá theo tiêu chí", 
+            fig_pass_fail_position = px.bar(position_counts, x="Vị trí tương ứng", y="Số lượng ứng viên", color="Đánh giá theo tiêu chí",
                                             title="Tỷ lệ Đánh giá theo tiêu chí theo Vị trí tương ứng",
-                                            labels={"count": "Số lượng ứng viên", "Vị trí tương ứng": "Vị trí tương ứng"},
-                                            color_discrete_map={"Pass": "green", "Fail": "red"})
+                                            labels={"Vị trí tương ứng": "Vị trí tương ứng"},
+                                            color_discrete_map=EVALUATION_COLORS)
             st.plotly_chart(fig_pass_fail_position, use_container_width=True)
         
         st.header("🎯 Biểu đồ kỹ năng ứng viên")
         col1, col2 = st.columns([1, 2])
         with col1:
-            selected_candidate = st.selectbox("Chọn ứng viên", df['Tên ứng viên'].tolist())
-            candidate_data = df[df['Tên ứng viên'] == selected_candidate].iloc[0]
+            selected_candidate = st.selectbox("Chọn ứng viên", list(candidate_index))
+            candidate_data = df.iloc[candidate_index[selected_candidate]]
             
             fig_info = go.Figure(data=[go.Table(
                 header=dict(values=['Thông tin', 'Giá trị'],
@@ -121,7 +200,7 @@ def dashboard():
             st.subheader("Tóm tắt ứng viên theo CV")
             st.write(candidate_summary_hard)
         with col2:
-            st.plotly_chart(plot_candidate_radar(df, selected_candidate), use_container_width=True)
+            st.plotly_chart(plot_candidate_radar(candidate_data), use_container_width=True)
         
         st.header("🔍 Lọc và Sắp xếp ứng viên")
         col1, col2, col3, col4 = st.columns(4)
@@ -130,33 +209,39 @@ def dashboard():
         with col2:
             min_score_hard = st.number_input("Điểm tổng quát theo CV tối thiểu", min_value=0, max_value=10, value=0)
         with col3:
-            selected_position = st.multiselect("Chọn Vị trí tương ứng", df['Vị trí tương ứng'].unique())
+            selected_position = st.multiselect("Chọn Vị trí tương ứng", list(df['Vị trí tương ứng'].cat.categories))
         with col4:
             sort_by = st.selectbox("Sắp xếp theo", ["Điểm tổng quát theo tiêu chí", "Điểm tổng quát theo CV", "Mức lương mong muốn"])
         
-        filtered_df = df[(df['Điểm tổng quát theo tiêu chí'] >= min_score_soft) & (df['Điểm tổng quát theo CV'] >= min_score_hard)]
+        filtered_df = df[at_least(df['Điểm tổng quát theo tiêu chí'], min_score_soft) &
+                         at_least(df['Điểm tổng quát theo CV'], min_score_hard)]
         if selected_position:
             filtered_df = filtered_df[filtered_df['Vị trí tương ứng'].isin(selected_position)]
         filtered_df = filtered_df.sort_values(sort_by, ascending=False)
         
+        filtered_df = paginate(filtered_df, 'dashboard_filtered_page')
         st.dataframe(filtered_df[['Tên ứng viên', 'Điểm tổng quát theo CV', 'Tóm tắt theo CV', 'Mức lương mong muốn', 'Vị trí tương ứng', 'Điểm tổng quát theo tiêu chí', 'Tóm tắt theo tiêu chí', 'Đánh giá theo tiêu chí']])
         st.header("🥇 Top ứng viên theo Vị trí tương ứng")
-        positions = ['Tư vấn', 'Quản lý', 'Nhân viên', 'Thực tập sinh']
-        for position in positions:
+        for position in TOP_POSITIONS:
             if position != 'Thực tập sinh':
                 st.subheader(f"Top 5 ứng viên cho Vị trí tương ứng: {position} theo tiêu chí")
-                top_candidates_position = df[df['Vị trí tương ứng'] == position].sort_values('Điểm tổng quát theo tiêu chí', ascending=False).head(5)
-                display_df = top_candidates_position[['Tên ứng viên', 'Điểm tổng quát theo tiêu chí', 'Điểm tổng quát theo CV', 'Trục Năng lực', 'Trục Phù hợp Văn hóa', 'Trục Tương lai', 'Tiêu chí khác', 'Điểm cộng', 'Điểm trừ']]
+                top_candidates_position = top_candidates['Điểm tổng quát theo tiêu chí']
+                top_candidates_position = top_candidates_position[top_candidates_position['Vị trí tương ứng'] == position]
+                columns = ['Tên ứng viên', 'Điểm tổng quát theo tiêu chí', 'Điểm tổng quát theo CV', 'Trục Năng lực', 'Trục Phù hợp Văn hóa', 'Trục Tương lai', 'Tiêu chí khác', 'Điểm cộng', 'Điểm trừ']
+                if ESTIMATE_COLUMN in top_candidates_position.columns:
+                    columns.insert(2, ESTIMATE_COLUMN)
+                display_df = top_candidates_position[columns]
                 display_df['Điểm tổng quát theo CV'] = display_df['Điểm tổng quát theo CV'].apply(lambda x: f"{x:.2f}")
                 st.table(display_df)
             else:
                 st.subheader(f"Top 5 ứng viên cho Vị trí tương ứng: {position} theo CV")
-                top_candidates_position = df[df['Vị trí tương ứng'] == position].sort_values('Điểm tổng quát theo CV', ascending=False).head(5)
+                top_candidates_position = top_candidates['Điểm tổng quát theo CV']
+                top_candidates_position = top_candidates_position[top_candidates_position['Vị trí tương ứng'] == position]
                 display_df = top_candidates_position[['Tên ứng viên', 'Điểm tổng quát theo CV', 'Điểm tổng quát theo tiêu chí', 'Mức độ phù hợp', 'Kỹ năng kỹ thuật', 'Kinh nghiệm', 'Trình độ học vấn', 'Kỹ năng mềm']]
                 display_df['Điểm tổng quát theo CV'] = display_df['Điểm tổng quát theo CV'].apply(lambda x: f"{x:.2f}")
                 st.table(display_df)
         st.header("📋 Dữ liệu chi tiết")
-        st.dataframe(df)
+        st.dataframe(paginate(df, 'dashboard_detail_page'))
 
     else:
-        st.info("Vui lòng tải lên file CSV đã tải xuống từ tab 'Đánh giá CV' để xem dashboard.")
+        st.info("Vui lòng tải lên file CSV hoặc Parquet đã tải xuống từ tab 'Đánh giá CV' để xem dashboard.")
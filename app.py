@@ -1,207 +1,176 @@
 import streamlit as st
-import google.generativeai as genai
-from pypdf import PdfReader
-import pandas as pd
-import requests
-from io import BytesIO
 import os
-import time
 import re
-from html import unescape
-import json
-from docx import Document
+from functools import partial
 from analyze import dashboard
-from bs4 import BeautifulSoup
-from config import cleaned_schema, new_schema
-from PIL import Image
+from base_api import extract_ids_from_url
+from config import DEDUPE_ENABLED, PRESCREEN_THRESHOLD, PRESCREEN_TOP_K, SCORING_MODE, STREAM_PREVIEW_ROWS, STREAMING_MODE
+from cache import CVTextCache, ScoreCache, SyncState
+from jobs import JobManager
+from scoring import RateLimiter, configure_gemini
 
-im = Image.open("aplus.ico")
+# Các module nặng (pandas, pipeline và các thư viện đọc CV, Gemini) được import trong hàm dùng đến chúng:
+# Streamlit chạy lại script này ở mỗi lần tương tác và container lạnh phải chờ import xong mới hiển thị trang.
 
 # Function definitions
 def is_valid_url(url):
     pattern = r'https://hiring\.base\.vn/opening/candidates/(\d+)\?stage=(\d+)$'
     return re.match(pattern, url) is not None
 
+@st.cache_resource
+def load_icon():
+    # Icon trang đọc một lần cho mỗi process thay vì ở mỗi lần chạy script
+    from PIL import Image
+    icon = Image.open("aplus.ico")
+    icon.load()
+    return icon
+
 def load_job_descriptions(csv_file):
+    import pandas as pd
     df = pd.read_csv(csv_file)
     return dict(zip(df['Position'], df['Job_Description']))
 
-def get_pdf_text_from_url(url):
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        with BytesIO(response.content) as f:
-            reader = PdfReader(f)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + " "
-        return ' '.join(text.split()) # Xóa khoảng trắng thừa nếu có
-    except Exception as e:
-        st.error(f"Lỗi khi tải hoặc trích xuất văn bản từ URL {url}: {str(e)}")
-        return None
-
-def get_docx_text_from_url(url):
+@st.cache_resource
+def get_rate_limiter():
+    # Quota Gemini tính theo API key nên dùng chung một RateLimiter cho mọi session trong process
+    return RateLimiter()
+
+@st.cache_resource
+def get_cv_cache():
+    return CVTextCache()
+
+@st.cache_resource
+def get_score_cache():
+    return ScoreCache()
+
+@st.cache_resource
+def get_sync_state():
+    return SyncState()
+
+@st.cache_resource
+def get_dedupe_index():
+    from dedupe import NearDuplicateIndex
+    return NearDuplicateIndex() if DEDUPE_ENABLED else None
+
+@st.cache_resource
+def get_job_manager():
+    # Dùng chung cho mọi session: nhiều người có thể xếp hàng chấm các opening khác nhau cùng lúc
+    return JobManager()
+
+def render_metrics(job):
+    import pandas as pd
+    summary = job.metrics.summary()
+    with st.expander("⏱️ Số liệu hiệu năng của lần chạy"):
+        st.caption(f"Tổng thời gian: {summary['wall_s']} giây")
+        if summary['stages']:
+            st.dataframe(pd.DataFrame(summary['stages']).T)
+        if summary['counters']:
+            st.json(summary['counters'])
+        st.download_button(
+            label="📥 Tải xuống số liệu JSON",
+            data=job.metrics.to_json().encode('utf-8'),
+            file_name="so_lieu_danh_gia_cv.json",
+            mime="application/json",
+            key=f"metrics_{job.id}",
+        )
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def streamed_csv(path):
+    # CSV chỉ là file tạm cho lần tải xuống này, xóa ngay sau khi đọc
+    import tempfile
+    from results_io import parquet_to_csv
+    fd, csv_path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        
-        with BytesIO(response.content) as f:
-            document = Document(f)
-            text = ""
-            for para in document.paragraphs:
-                text += para.text + "\n"
-        return ' '.join(text.split()) # Xóa khoảng trắng thừa nếu có
-    except Exception as e:
-        print(f"Lỗi khi tải hoặc trích xuất văn bản từ URL {url}: {str(e)}")
-        return None
-
-# Hàm kiểm tra định dạng file và chọn hàm tương ứng
-def get_cv_text_from_url(cv_url):
-    if not isinstance(cv_url, str):
-        print(f"Invalid URL format: {cv_url}. Expected string, got {type(cv_url)}.")
-        return None
-    
-    cv_url = cv_url.strip()  # Remove any leading/trailing whitespace
-    
-    if not cv_url:  # Check if the URL is empty after stripping
-        print("Empty URL provided.")
-        return None
-
-    if cv_url.lower().endswith('.pdf'):
-        return get_pdf_text_from_url(cv_url)
-    elif cv_url.lower().endswith('.docx'):
-        return get_docx_text_from_url(cv_url)
-    else:
-        print(f"Unsupported file format for URL: {cv_url}")
-        return None
-
-def get_gemini_response1(prompt, content):
-    model = genai.GenerativeModel('models/gemini-1.5-flash-latest',
-                                  generation_config={
-                                      "response_mime_type": "application/json",
-                                      "response_schema": cleaned_schema
-                                  })
-    response = model.generate_content(prompt + content)
-    response_json = json.loads(response.text)
-    time.sleep(3)
-    return response_json
-    
-def get_gemini_response2(prompt, content):
-    model = genai.GenerativeModel('models/gemini-1.5-flash-latest',
-                                    generation_config={
-                                        "response_mime_type": "application/json",
-                                        "response_schema": new_schema # Dùng schema đã làm sạch
-                                    }
-                                    )
-
-    response = model.generate_content(prompt + content)
-    response_json = json.loads(response.text)
-    time.sleep(3)
-    return response_json
-
-def extract_ids_from_url(url):
-    match = re.search(r'candidates/(\d+)\?stage=(\d+)', url)
-    if match:
-        return match.group(1), match.group(2)
-    return None, None
-
-def fetch_data(job_url, access_token):
-    opening_id, stage_id = extract_ids_from_url(job_url)
-    if not opening_id or not stage_id:
-        st.error("URL không hợp lệ. Không thể trích xuất opening_id và stage_id.")
-        return None
-    api_url = "https://hiring.base.vn/publicapi/v2/candidate/list"
-    payload = {
-        'access_token': access_token,
-        'opening_id': opening_id,
-        'num_per_page': '10000',
-        'stage_id': stage_id,
-        'start_date': '2023-11-01',
-        'end_date': ''
-    }
-    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-    response = requests.post(api_url, headers=headers, data=payload)
-    return response.json()
-
-def extract_salary(fields):
-    for field in fields:
-        if field.get('id') == 'muc_luong_mong_muon':  
-            salary = extract_numeric_salary(field.get('value', '0'))
-            return salary if salary is not None else -1
-    return -1  # Return 0 if 'muc_luong_mong_muon' field is not found
-
-def extract_numeric_salary(salary):
-    if not salary:
-        return 0
-    match = re.search(r'(\d{1,3}(?:,\d{3})*)', str(salary))
-    return int(match.group(1).replace(',', '')) if match else -1
-
-def process_data(data):
-    if 'candidates' not in data:
-        st.error("Không tìm thấy ứng viên trong phản hồi.")
-        return None
-    df = pd.DataFrame(data['candidates'])
-    
-    df['cvs'] = df['cvs'].apply(lambda x: x[0] if len(x) > 0 else None)
-    df['cvs'] = df['cvs'].astype(str) 
-    df['title'] = df['title'].apply(lambda x: re.sub(r'<.*?>', '', x) if isinstance(x, str) else x)
-    df['name'] = df['name'].apply(lambda x: unescape(x))
-    df['expect_salary'] = df['form'].apply(extract_salary)
-    
-    # Filter rows where 'cvs' is not None or "None"
-    df = df[df['cvs'].notnull() & (df['cvs'] != "None")]
-    
-    # Remove columns with all NaN values
-    df = df.dropna(axis=1, how='all')
-    
-    selected_df = df[['id', 'name', 'email', 'status', 'cvs', 'expect_salary']]
-    
-    return selected_df
-
-def fetch_jd(job_url, access_token):
-    opening_id, stage_id = extract_ids_from_url(job_url)
-    if not opening_id or not stage_id:
-        st.error("URL không hợp lệ. Không thể trích xuất opening_id và stage_id.")
-        return None
-    api_url = "https://hiring.base.vn/publicapi/v2/opening/get"
-    payload = {
-        'access_token': access_token,
-        'id': opening_id,
-    }
-    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-    response = requests.post(api_url, headers=headers, data=payload)
-     # Parse the JSON response
-    json_response = response.json()
-    
-    # Get the 'content' field
-    html_content = json_response.get('opening', {}).get('content', '')
-    
-    # Use BeautifulSoup to convert HTML content to plain text
-    soup = BeautifulSoup(html_content, "html.parser")
-    plain_text = soup.get_text()
-   
-    return plain_text
-
-def select_jd(salary, jd_df):
-    if salary <= 0:  # If salary is not specified or invalid
-        return pd.Series({'Position': "Chưa sắp xếp được vị trí", 'Job_Description': "Không có tiêu chí để chấm nên chấm 0 điểm hết"})
-    elif 0 < salary < 500:
-        return jd_df.iloc[0]
-    elif 500 <= salary < 1000:
-        return jd_df.iloc[1]
-    elif 1000 <= salary < 1500:
-        return jd_df.iloc[2]
-    elif salary >= 1500:
-        return jd_df.iloc[3]
+        return read_file(parquet_to_csv(path, csv_path))
+    finally:
+        os.remove(csv_path)
+
+def render_job(job):
+    import pandas as pd
+    from results_io import read_preview, results_to_csv, results_to_parquet
+    with st.container(border=True):
+        st.subheader(f"📌 {job.label}")
+        status_text = {'queued': "⏳ Đang chờ", 'running': "⚙️ Đang chạy", 'done': "✅ Hoàn tất", 'failed': "❌ Lỗi"}[job.status]
+        st.caption(f"Job {job.id} · {status_text}")
+        total = max(job.total, 1)
+        st.progress(min(1.0, job.downloaded / total), text=f"📥 Tải và trích xuất CV: {job.downloaded}/{job.total}")
+        st.progress(min(1.0, job.scored / total), text=f"🤖 Chấm điểm CV: {job.scored}/{job.total}")
+        for level, text in list(job.messages):
+            getattr(st, level)(text)
+        render_metrics(job)
+
+        if not job.finished:
+            if job.results:
+                st.dataframe(pd.DataFrame(list(job.results)))
+            return
+
+        st.caption(f"🗄️ Cache CV: {job.cache_hits} lần dùng lại, {job.cache_misses} lần tải mới")
+        st.caption(f"♻️ {job.cached_results}/{job.result_count} ứng viên dùng lại kết quả chấm trước đó (CV, JD, schema và model không đổi)")
+        if job.results_path and job.result_count:
+            # Chế độ streaming: kết quả nằm trong file Parquet, chỉ hiển thị vài dòng đầu.
+            # File chỉ được đọc (và chuyển sang CSV) khi người dùng bấm tải xuống.
+            st.subheader("📊 Kết quả đánh giá CV")
+            st.caption(f"Hiển thị {min(STREAM_PREVIEW_ROWS, job.result_count)}/{job.result_count} dòng đầu, "
+                       f"tải file để xem đầy đủ.")
+            st.dataframe(read_preview(job.results_path, STREAM_PREVIEW_ROWS))
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button(
+                    label="📥 Tải xuống kết quả đánh giá CSV",
+                    data=partial(streamed_csv, job.results_path),
+                    file_name="ket_qua_danh_gia_cv.csv",
+                    mime="text/csv",
+                    key=f"download_{job.id}",
+                )
+            with col2:
+                st.download_button(
+                    label="📥 Tải xuống kết quả đánh giá Parquet",
+                    data=partial(read_file, job.results_path),
+                    file_name="ket_qua_danh_gia_cv.parquet",
+                    mime="application/vnd.apache.parquet",
+                    key=f"download_parquet_{job.id}",
+                )
+            return
+        final_df = job.final_df
+        if final_df is not None:
+            st.subheader("📊 Kết quả đánh giá CV")
+            st.header("📋 Dữ liệu chi tiết")
+            st.dataframe(final_df)
+
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button(
+                    label="📥 Tải xuống kết quả đánh giá CSV",
+                    data=partial(results_to_csv, final_df),
+                    file_name="ket_qua_danh_gia_cv.csv",
+                    mime="text/csv",
+                    key=f"download_{job.id}",
+                )
+            with col2:
+                # Parquet giữ nguyên kiểu dữ liệu và đọc nhanh hơn nhiều khi tải lên Dashboard
+                st.download_button(
+                    label="📥 Tải xuống kết quả đánh giá Parquet",
+                    data=partial(results_to_parquet, final_df),
+                    file_name="ket_qua_danh_gia_cv.parquet",
+                    mime="application/vnd.apache.parquet",
+                    key=f"download_parquet_{job.id}",
+                )
+        elif job.status == 'done':
+            st.warning("⚠️ Không có kết quả nào được tạo. Vui lòng kiểm tra API key và thử lại.")
+
 # Main application
 
-st.set_page_config(page_title="Công Cụ Đánh Giá CV và Lấy Dữ Liệu Công Việc", page_icon=im, layout="wide")
+st.set_page_config(page_title="Công Cụ Đánh Giá CV và Lấy Dữ Liệu Công Việc", page_icon=load_icon(), layout="wide")
 st.title("🚀 Công Cụ Đánh Giá CV và Lấy Dữ Liệu Công Việc")
 
 # Configure Google API
 api_key = st.secrets["GOOGLE_API_KEY"]
 if api_key:
-    genai.configure(api_key=api_key)
+    configure_gemini(api_key)
 else:
     st.error("Không tìm thấy GOOGLE_API_KEY trong biến môi trường. Vui lòng kiểm tra cấu hình trước khi sử dụng ứng dụng.")
     st.stop()
@@ -255,156 +224,59 @@ with tab1:
     st.header("🔍 Lấy Dữ Liệu Ứng Viên")
     
     candidate_url = st.text_input("🔗 Nhập URL danh sách ứng viên:")
+    combined_mode = st.checkbox("⚡ Chấm gộp: một lần gọi Gemini cho mỗi CV", value=SCORING_MODE != 'separate')
+    batch_mode = st.checkbox("📦 Gộp nhiều CV vào một lần gọi Gemini", value=SCORING_MODE == 'batch')
+    tiered_mode = st.checkbox("🪜 Chấm theo tầng: model nhanh trước, model mạnh chỉ cho ứng viên sát ngưỡng đạt",
+                              value=SCORING_MODE == 'tiered')
+    incremental = st.checkbox("🔁 Chỉ chấm ứng viên mới kể từ lần đồng bộ trước")
+    prescreen = st.checkbox("🧮 Lọc sơ bộ bằng TF-IDF trước khi chấm bằng Gemini")
+    streaming = st.checkbox("💾 Ghi kết quả thẳng ra file (dành cho opening rất nhiều ứng viên)", value=STREAMING_MODE)
+    if prescreen:
+        col1, col2 = st.columns(2)
+        prescreen_top_k = col1.number_input("Số CV tối đa gửi lên Gemini (0 = không giới hạn)", min_value=0,
+                                            value=PRESCREEN_TOP_K or 0, step=10)
+        prescreen_threshold = col2.number_input("Ngưỡng tương đồng tối thiểu", min_value=0.0, max_value=1.0,
+                                                value=PRESCREEN_THRESHOLD, step=0.01)
+    else:
+        prescreen_top_k, prescreen_threshold = PRESCREEN_TOP_K, PRESCREEN_THRESHOLD
     access_token = os.getenv('BASE_API_KEY')
+    job_manager = get_job_manager()
+    if 'job_ids' not in st.session_state:
+        st.session_state['job_ids'] = []
     if st.button("🔎 Lấy Thông Tin Ứng Viên"):
         if candidate_url and access_token:
             if is_valid_url(candidate_url):
-                data = process_data(fetch_data(candidate_url, access_token))
-                st.success("✅ Đã lấy thông tin ứng viên thành công!")
-                st.header("📊 Đánh giá và Lọc CV")
-                jd_df = pd.read_csv('JD_tc.csv')
-                jd2 = fetch_jd(candidate_url, access_token)
-                results = []
-                progress_bar = st.progress(0)
-                    
-                for i, (_, row) in enumerate(data.iterrows()):
-                    name = row['name']
-                    cv_url = row['cvs']
-                    expect_salary = row.get('expect_salary', -1)
-                    
-                    cv_text = get_cv_text_from_url(cv_url)
-                
-                    if cv_text:
-                        # Always evaluate using prompt 2
-                        prompt2 = f"""
-                        Bạn là một chuyên gia nhân sự và tuyển dụng. Hãy đánh giá CV dưới đây dựa trên mô tả công việc và cung cấp phản hồi chính xác theo schema JSON được định nghĩa.
-                        Mô tả công việc:
-                        {jd2}
-                        CV:
-                        {cv_text}
-                        Vui lòng trả về kết quả đánh giá theo đúng schema JSON đã định nghĩa.
-                        """
-                        try:
-                            response2 = get_gemini_response2(prompt2, cv_text)
-                            main_CV_score = round((response2["muc_do_phu_hop"] + response2["ky_nang_ky_thuat"] + response2["kinh_nghiem"] + response2["trinh_do_hoc_van"] + response2["ky_nang_mem"])/5, 2)
-                
-                            if expect_salary > 0:
-                                # If salary is specified, evaluate using prompt 1 and assign position
-                                jd_row = select_jd(expect_salary, jd_df)
-                                position = jd_row['Position']
-                                jd1 = jd_row['Job_Description']
-                                
-                                prompt1 = f"""
-                                Bạn là một chuyên gia nhân sự và tuyển dụng. Hãy đánh giá CV dưới đây dựa trên mô tả công việc và cung cấp phản hồi chính xác theo schema JSON được định nghĩa.
-                                Mô tả công việc:
-                                {jd1}
-                                
-                                Điểm trừ ( mỗi tiêu chí +5 điểm) nếu hồ sơ có các điểm sau : 
-                                1.	Thiếu kinh nghiệm: Không có đủ kinh nghiệm làm việc liên quan đến vị trí ứng tuyển cho các vị trí nhân viên trở lên. 
-                                2.	Lỗi chính tả và ngữ pháp: Hồ sơ có nhiều lỗi chính tả hoặc ngữ pháp, thể hiện sự thiếu cẩn thận.
-                                3.	Thời gian nghỉ việc dài: Có khoảng thời gian dài không làm việc mà không có lý do rõ ràng.
-                                4.	Thay đổi công việc thường xuyên: Có nhiều lần thay đổi công việc trong thời gian ngắn, có thể gây lo ngại về tính ổn định.
-                                5.	Thiếu thông tin quan trọng: Hồ sơ không cung cấp đủ thông tin về quá trình học tập, kinh nghiệm làm việc hoặc kỹ năng.
-                                6.	Thiếu thông tin liên hệ: Không cung cấp thông tin liên lạc đầy đủ hoặc chính xác.
-                                7.	Không rõ ràng về mục tiêu nghề nghiệp: Mục tiêu nghề nghiệp không rõ ràng hoặc không phù hợp với vị trí ứng tuyển.
-                                8.	Thái độ không chuyên nghiệp: Sử dụng ngôn ngữ không phù hợp hoặc có những bình luận tiêu cực về công việc trước đây.
-                                
-                                Điểm cộng  ( Mỗi tiêu chí +5 điểm ) nếu hồ sơ thể hiện : 
-                                1.	Kinh nghiệm làm việc phong phú: Có nhiều năm kinh nghiệm trong lĩnh vực liên quan hoặc trong các vị trí tương tự.
-                                2.	Kỹ năng chuyên môn mạnh: Sở hữu các kỹ năng chuyên môn cần thiết cho công việc, như kỹ năng phân tích, lập trình, hay quản lý dự án.
-                                3.	Chứng chỉ và bằng cấp phù hợp: Có các chứng chỉ và bằng cấp liên quan đến vị trí ứng tuyển, thể hiện sự cam kết trong nghề nghiệp.
-                                4.	Kỹ năng giao tiếp tốt:  Khả năng giao tiếp rõ ràng và hiệu quả, có thể làm việc với nhiều đối tượng khác nhau.
-                                5.	Thành tích nổi bật: Có thành tích đáng chú ý trong công việc trước đây, như tăng hiệu quả, cải thiện quy trình làm việc, hoặc dự án thành công.
-                                6.	Thái độ tích cực và chuyên nghiệp: Thể hiện sự nhiệt tình, trách nhiệm và thái độ tích cực trong công việc.
-                                
-                                CV:
-                                {cv_text}
-                    
-                                Vui lòng trả về kết quả đánh giá theo đúng schema JSON đã định nghĩa.
-                                Chú ý: Các tiêu chí mà bạn không chắc hoặc không ghi rõ trong CV thì bạn sẽ +0 điểm.
-                                """
-                                response1 = get_gemini_response1(prompt1, cv_text)
-                                main_criteria_score = response1["truc_nang_luc"] + response1["truc_van_hoa"] + response1["truc_tuong_lai"] + response1["tieu_chi_khac"] + response1["diem_cong"] - response1["diem_tru"]
-                                
-                                # Determine Pass/Fail based on salary and main criteria score
-                                if expect_salary < 500:
-                                    pass_fail = "Pass" if main_criteria_score >= 70 else "Fail"
-                                elif 500 <= expect_salary < 1000:
-                                    pass_fail = "Pass" if main_criteria_score >= 75 else "Fail"
-                                elif 1000 <= expect_salary < 1500:
-                                    pass_fail = "Pass" if main_criteria_score >= 80 else "Fail"
-                                else:  # expect_salary >= 1500
-                                    pass_fail = "Pass" if main_criteria_score >= 85 else "Fail"
-                            else:
-                                # If no salary is specified, use default values and don't assign a position
-                                position = "Chưa sắp xếp được vị trí"
-                                response1 = {
-                                    "truc_nang_luc": 0,
-                                    "truc_van_hoa": 0,
-                                    "truc_tuong_lai": 0,
-                                    "tieu_chi_khac": 0,
-                                    "diem_cong": 0,
-                                    "diem_tru": 0,
-                                    "tom_tat": "Không có mức lương kỳ vọng, chỉ đánh giá kỹ năng chung"
-                                }
-                                main_criteria_score = 0
-                                pass_fail = "N/A"
-                
-                            uv = {
-                                'Tên ứng viên': name,
-                                'Vị trí': position,
-                                'Trục Năng lực soft skill': response1["truc_nang_luc"],
-                                'Trục Phù hợp Văn hóa soft skill': response1["truc_van_hoa"],
-                                'Trục Tương lai soft skill': response1["truc_tuong_lai"],
-                                'Tiêu chí khác soft skill': response1["tieu_chi_khac"],
-                                'Điểm cộng soft skill': response1["diem_cong"],
-                                'Điểm trừ soft skill': response1["diem_tru"],
-                                'Điểm tổng quát soft skill': main_criteria_score,
-                                'Đánh giá soft skill': pass_fail,
-                                'Tóm tắt soft skill': response1["tom_tat"],
-                                'Mức độ phù hợp hard skill': response2["muc_do_phu_hop"],
-                                'Kỹ năng kỹ thuật hard skill': response2["ky_nang_ky_thuat"],
-                                'Kinh nghiệm hard skill': response2["kinh_nghiem"],
-                                'Trình độ học vấn hard skill': response2["trinh_do_hoc_van"],
-                                'Kỹ năng mềm hard skill': response2["ky_nang_mem"],
-                                'Điểm tổng quát hard skill': main_CV_score,
-                                'Tóm tắt hard skill': response2["tom_tat"]
-                            }
-                
-                            results.append(uv)
-                        except Exception as e:
-                            st.error(f"❌ Lỗi khi xử lý CV từ {cv_url}: {str(e)}")
-                            continue
-            
-                    progress_bar.progress(min(1.0, (i + 1) / len(data)))
-                    
-            if results:
-                st.subheader("📊 Kết quả đánh giá CV")
-                df_results = pd.DataFrame(results)
-                final_df = pd.merge(data, df_results, left_on='name', right_on='Tên ứng viên', how='inner')
-                final_df.drop(columns=['Tên ứng viên'], inplace=True)
-                final_df.rename(columns={
-                    'id': 'Mã ứng viên',
-                    'name': "Tên ứng viên",
-                    'email': 'Email',
-                    'expect_salary': "Mức lương mong muốn",
-                    'status': 'Trạng thái',
-                    'cvs': 'Link CV',
-                }, inplace=True)
-                
-                st.header("📋 Dữ liệu chi tiết")
-                st.dataframe(final_df)
-
-                csv = final_df.to_csv(index=False).encode('utf-8-sig')
-                st.download_button(
-                    label="📥 Tải xuống kết quả đánh giá CSV",
-                    data=csv,
-                    file_name="ket_qua_danh_gia_cv.csv",
-                    mime="text/csv",
+                from pipeline import score_opening
+                opening_id, stage_id = extract_ids_from_url(candidate_url)
+                job = job_manager.submit(
+                    (opening_id, stage_id), f"Opening {opening_id} · Stage {stage_id}",
+                    score_opening, candidate_url, access_token,
+                    get_rate_limiter(), get_cv_cache(), get_score_cache(), get_sync_state(),
+                    scoring_mode='tiered' if tiered_mode else 'batch' if batch_mode else 'combined' if combined_mode else 'separate',
+                    incremental=incremental,
+                    prescreen=prescreen, prescreen_top_k=prescreen_top_k or None,
+                    prescreen_threshold=prescreen_threshold, dedupe_index=get_dedupe_index(), streaming=streaming,
                 )
-            else:
-                st.warning("⚠️ Không có kết quả nào được tạo. Vui lòng kiểm tra API key và thử lại.")
-                
+                if job.id not in st.session_state['job_ids']:
+                    st.session_state['job_ids'].append(job.id)
+                st.success(f"✅ Đã đưa opening {opening_id} vào hàng đợi chấm điểm (job {job.id}).")
+
+    session_jobs = [job_manager.get(job_id) for job_id in st.session_state['job_ids']]
+    session_jobs = [job for job in session_jobs if job is not None]
+    running = any(not job.finished for job in session_jobs)
+
+    # Job chạy nền; khung này tự làm mới để hiển thị tiến độ và kết quả từng phần
+    @st.fragment(run_every=2 if running else None)
+    def job_panel():
+        if session_jobs:
+            st.header("📊 Đánh giá và Lọc CV")
+        for job in reversed(session_jobs):
+            render_job(job)
+        if running and all(job.finished for job in session_jobs):
+            st.rerun()
+
+    job_panel()
+
 with tab3:
     dashboard()
 
@@ -0,0 +1,86 @@
+import re
+
+from config import BASE_API_URL, BASE_PAGE_SIZE, BASE_START_DATE, JD_CACHE_TTL
+from http_client import post
+from metrics import optional_timer
+from resources import TTLCache
+
+CANDIDATE_LIST_URL = f"{BASE_API_URL}/candidate/list"
+OPENING_GET_URL = f"{BASE_API_URL}/opening/get"
+HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+_jd_cache = TTLCache(JD_CACHE_TTL)
+
+
+def extract_ids_from_url(url):
+    match = re.search(r'candidates/(\d+)\?stage=(\d+)', url)
+    if match:
+        return match.group(1), match.group(2)
+    return None, None
+
+def iter_candidate_pages(opening_id, stage_id, access_token, start_date=BASE_START_DATE, page_size=BASE_PAGE_SIZE,
+                         metrics=None):
+    # Lấy danh sách ứng viên theo từng trang để pipeline bắt đầu xử lý ngay khi trang đầu tiên về
+    page = 1
+    while True:
+        payload = {
+            'access_token': access_token,
+            'opening_id': opening_id,
+            'stage_id': stage_id,
+            'page': page,
+            'num_per_page': page_size,
+            'start_date': start_date,
+            'end_date': ''
+        }
+        with optional_timer(metrics, 'base_candidate_page_s'):
+            response = post(CANDIDATE_LIST_URL, payload, HEADERS)
+        if metrics is not None:
+            metrics.observe('base_candidate_page_bytes', len(response.content))
+        response.raise_for_status()
+        data = response.json()
+        # Base trả HTTP 200 kèm code 0 khi lỗi (VD: access_token sai); coi là trang rỗng thì job báo thành công
+        # và mốc ngày đồng bộ bị đẩy lên, các ứng viên chưa lấy được sẽ bị bỏ qua ở những lần sau
+        if 'candidates' not in data or data.get('code') == 0:
+            raise ValueError(f"Không tìm thấy ứng viên trong phản hồi của Base API: {data.get('message') or data}")
+        candidates = data['candidates'] or []
+        if not candidates:
+            return
+        yield candidates
+        if len(candidates) < page_size:
+            return
+        page += 1
+
+def fetch_jd(job_url, access_token, metrics=None):
+    opening_id, stage_id = extract_ids_from_url(job_url)
+    if not opening_id or not stage_id:
+        print("URL không hợp lệ. Không thể trích xuất opening_id và stage_id.")
+        return None
+    payload = {
+        'access_token': access_token,
+        'id': opening_id,
+    }
+    with optional_timer(metrics, 'base_fetch_jd_s'):
+        response = post(OPENING_GET_URL, payload, HEADERS)
+    if metrics is not None:
+        metrics.observe('base_fetch_jd_bytes', len(response.content))
+    # Parse the JSON response
+    json_response = response.json()
+
+    # Get the 'content' field
+    html_content = json_response.get('opening', {}).get('content', '')
+
+    # Use BeautifulSoup to convert HTML content to plain text
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html_content, "html.parser")
+    plain_text = soup.get_text()
+
+    return plain_text
+
+def get_jd(job_url, access_token, metrics=None):
+    # fetch_jd dùng chung cho cả process: JD của một opening được giữ JD_CACHE_TTL giây và
+    # nhiều job cùng lấy một JD một lúc (VD: hai người chấm cùng opening) chỉ gọi Base API một lần
+    opening_id, _ = extract_ids_from_url(job_url)
+    text, hit = _jd_cache.get_or_load((opening_id, access_token), lambda: fetch_jd(job_url, access_token, metrics))
+    if hit and metrics is not None:
+        metrics.incr('jd_cache_hits')
+    return text
@@ -0,0 +1,83 @@
+import os
+import random
+
+from docx import Document
+
+# Bộ CV giả để đo hiệu năng: mỗi cỡ CV có số trang và số dòng khác nhau
+SIZES = {
+    'small': 1,
+    'medium': 3,
+    'large': 8,
+}
+LINES_PER_PAGE = 45
+FORMATS = ('pdf', 'docx')
+
+SKILLS = ["Python", "SQL", "Excel", "Power BI", "Java", "React", "Docker", "Kubernetes", "Marketing", "Sales",
+          "Recruitment", "Accounting", "Figma", "Project management", "Negotiation", "English IELTS 7.0"]
+WORDS = ["responsible", "for", "team", "project", "customer", "data", "report", "design", "deliver", "improve",
+         "process", "system", "analysis", "growth", "quality", "support", "lead", "build", "market", "product"]
+
+
+def cv_lines(rng, pages):
+    lines = [f"Candidate {rng.randint(1000, 9999)}", "CURRICULUM VITAE",
+             "Skills: " + ", ".join(rng.sample(SKILLS, 5))]
+    for page in range(pages):
+        lines.append(f"Experience {page + 1}: {rng.choice(SKILLS)} at Company {rng.randint(1, 500)}")
+        lines.extend(' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 16)))
+                     for _ in range(LINES_PER_PAGE - 1))
+    return lines
+
+def _pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def write_pdf(path, lines):
+    # PDF tối giản (font Helvetica chuẩn, mỗi trang một content stream) đủ để pypdf trích xuất văn bản
+    pages = [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)]
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in pages:
+        stream = "BT /F1 10 Tf 12 TL 40 800 Td " + ' '.join(f"({_pdf_escape(line)}) ' " for line in page) + "ET"
+        stream = stream.encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        page_ids.append(len(objects))
+    kids = ' '.join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b''.join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(bytes(out))
+
+def write_docx(path, lines):
+    document = Document()
+    for line in lines:
+        document.add_paragraph(line)
+    document.save(path)
+
+def build_corpus(directory, variants=10, seed=0):
+    # Tạo variants file cho mỗi tổ hợp định dạng x cỡ; trả về danh sách tên file.
+    # File đã có thì giữ nguyên để các lần chạy sau không phải tạo lại.
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    names = []
+    for size, pages in SIZES.items():
+        for fmt in FORMATS:
+            for variant in range(variants):
+                name = f"cv_{size}_{variant}.{fmt}"
+                path = os.path.join(directory, name)
+                lines = cv_lines(rng, pages)
+                if not os.path.exists(path):
+                    (write_pdf if fmt == 'pdf' else write_docx)(path, lines)
+                names.append(name)
+    return names
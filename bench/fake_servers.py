@@ -0,0 +1,150 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Kiểu trong responseSchema mà client REST của google-generativeai gửi lên (enum Type dạng số hoặc tên)
+SCHEMA_TYPES = {1: 'STRING', 2: 'NUMBER', 3: 'INTEGER', 4: 'BOOLEAN', 5: 'ARRAY', 6: 'OBJECT'}
+SALARIES = [-1, 300, 700, 1200, 2000]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # Header và body được ghi riêng; tránh độ trễ Nagle + delayed ACK trên kết nối keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, body, content_type='application/json', headers=None):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, obj, code=200):
+        self._send(code, json.dumps(obj, ensure_ascii=False).encode('utf-8'))
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+
+class FakeBaseHandler(_Handler):
+    # candidate/list và opening/get của Base public API, cùng file CV trong corpus tại /files/<i>/<tên file>.
+    # Số ứng viên của một opening chính là opening_id, VD: /opening/candidates/1000?stage=1 có 1000 ứng viên.
+    corpus_dir = None
+    files = []
+
+    def do_GET(self):
+        name = os.path.basename(urlparse(self.path).path)
+        path = os.path.join(self.corpus_dir, name)
+        if name not in self.files:
+            return self._json({}, 404)
+        # File trong corpus không đổi nên request có điều kiện luôn nhận 304
+        etag = f'"{name}"'
+        if self.headers.get('If-None-Match') == etag:
+            return self._send(304, b'', headers={'ETag': etag})
+        with open(path, 'rb') as f:
+            self._send(200, f.read(), 'application/octet-stream', {'ETag': etag})
+
+    def do_POST(self):
+        form = {key: values[0] for key, values in parse_qs(self._body().decode('utf-8')).items()}
+        if self.path.endswith('/candidate/list'):
+            total = int(form['opening_id'])
+            page, size = int(form['page']), int(form['num_per_page'])
+            start, end = (page - 1) * size, min(page * size, total)
+            return self._json({'candidates': [self.candidate(i) for i in range(start, end)]})
+        if self.path.endswith('/opening/get'):
+            return self._json({'opening': {'content': "<h2>Chuyên viên phân tích dữ liệu</h2>"
+                                                      "<ul><li>Python, SQL, Power BI</li><li>2 năm kinh nghiệm</li></ul>"}})
+        self._json({}, 404)
+
+    def candidate(self, i):
+        host = f"http://{self.headers['Host']}"
+        return {
+            'id': str(100000 + i),
+            'name': f"Ứng viên {i}",
+            'email': f"ung.vien{i}@example.com",
+            'status': '1',
+            'title': '<b>Ứng viên</b>',
+            # Mỗi ứng viên có URL CV riêng dù dùng chung file trong corpus
+            'cvs': [f"{host}/files/{i}/{self.files[i % len(self.files)]}"],
+            'form': [{'id': 'muc_luong_mong_muon', 'value': str(SALARIES[i % len(SALARIES)])}],
+        }
+
+
+class FakeGeminiHandler(_Handler):
+    # models/*:generateContent trả JSON hợp lệ theo responseSchema của request,
+    # chờ latency giây (±50%) và trả 429 với xác suất error_rate.
+    # model_latency: độ trễ riêng theo tên model (VD: model rẻ nhanh hơn khi đo chế độ 'tiered')
+    latency = 0.0
+    model_latency = {}
+    error_rate = 0.0
+    stats = None
+
+    def do_POST(self):
+        request = json.loads(self._body())
+        model = urlparse(self.path).path.rsplit('/', 1)[-1].split(':')[0]
+        latency = self.model_latency.get(model, self.latency)
+        if latency:
+            time.sleep(latency * random.uniform(0.5, 1.5))
+        with self.stats['lock']:
+            self.stats['requests'] += 1
+        if random.random() < self.error_rate:
+            with self.stats['lock']:
+                self.stats['429'] += 1
+            return self._json({'error': {'code': 429, 'message': 'Resource has been exhausted', 'status': 'RESOURCE_EXHAUSTED'}}, 429)
+        prompt = ' '.join(part.get('text', '') for content in request.get('contents', []) for part in content.get('parts', []))
+        schema = request.get('generationConfig', {}).get('responseSchema', {})
+        text = json.dumps(fill_schema(schema, prompt), ensure_ascii=False)
+        with self.stats['lock']:
+            usage = self.stats['models'].setdefault(model, {'requests': 0, 'prompt_tokens': 0})
+            usage['requests'] += 1
+            usage['prompt_tokens'] += len(prompt) // 4
+        self._json({
+            'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}, 'finishReason': 'STOP'}],
+            'usageMetadata': {'promptTokenCount': len(prompt) // 4, 'candidatesTokenCount': len(text) // 4},
+        })
+
+
+def fill_schema(schema, prompt, name=None):
+    schema_type = schema.get('type')
+    schema_type = SCHEMA_TYPES.get(schema_type, str(schema_type).upper())
+    if schema_type == 'OBJECT' or 'properties' in schema:
+        return {key: fill_schema(value, prompt, key) for key, value in schema.get('properties', {}).items()}
+    if schema_type == 'ARRAY':
+        # Request gộp nhiều CV: mỗi phần tử ứng với một mã ứng viên xuất hiện trong prompt
+        ids = re.findall(r'Mã ứng viên: (\S+)', prompt) or [None]
+        return [dict(fill_schema(schema['items'], prompt), ma_ung_vien=candidate_id) for candidate_id in ids]
+    if schema_type == 'INTEGER':
+        return random.randint(0, 10)
+    if schema_type == 'NUMBER':
+        return round(random.uniform(0, 10), 2)
+    if schema_type == 'BOOLEAN':
+        return random.random() < 0.5
+    return f"Nhận xét giả cho {name}"
+
+
+def _serve(handler):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def start_fake_base(corpus_dir, files):
+    handler = type('Handler', (FakeBaseHandler,), {'corpus_dir': corpus_dir, 'files': list(files)})
+    return _serve(handler)
+
+def start_fake_gemini(latency=0.0, error_rate=0.0, model_latency=None):
+    stats = {'lock': threading.Lock(), 'requests': 0, '429': 0, 'models': {}}
+    handler = type('Handler', (FakeGeminiHandler,), {'latency': latency, 'model_latency': dict(model_latency or {}),
+                                                     'error_rate': error_rate, 'stats': stats})
+    server, url = _serve(handler)
+    server.stats = stats
+    return server, url
@@ -0,0 +1,133 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bench.corpus import build_corpus
+from bench.fake_servers import start_fake_base, start_fake_gemini
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORT_STAGES = ['base_candidate_page_s', 'base_fetch_jd_s', 'cv_download_s', 'cv_parse_s', 'rate_limit_wait_s',
+                 'gemini_call_s', 'score_s']
+
+
+def peak_rss_mb(who='self'):
+    # who='children': process con đã kết thúc (VD: pool đọc CV sau khi shutdown), lấy process lớn nhất
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if who == 'children' else resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về byte
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def run_size(size, base_url, gemini_url, cache_dir, options):
+    # Chạy trong process riêng (spawn) để peak RSS của từng cỡ không lẫn vào nhau.
+    # Biến môi trường phải đặt trước khi import các module đọc config.
+    os.environ['BASE_API_URL'] = base_url
+    os.environ['CV_CACHE_DIR'] = cache_dir
+    from extract import shutdown_parse_pool
+    from jobs import Job
+    from pipeline import score_opening
+    from cache import SyncState
+    from scoring import RateLimiter, configure_gemini
+
+    configure_gemini('bench', endpoint=gemini_url)
+    job = Job((str(size), '1'), f"bench {size}")
+    candidate_url = f"https://hiring.base.vn/opening/candidates/{size}?stage=1"
+    start = time.perf_counter()
+    # Không dùng cache CV/điểm để mọi ứng viên đều đi qua đủ các giai đoạn
+    final_df = score_opening(job, candidate_url, 'bench', RateLimiter(options['rpm'], options['tpm']), None, None,
+                             SyncState(), scoring_mode=options['mode'], streaming=options['streaming'])
+    elapsed = time.perf_counter() - start
+    shutdown_parse_pool()  # RUSAGE_CHILDREN chỉ tính process con đã kết thúc
+    summary = job.metrics.summary()
+    return {
+        'candidates': size,
+        'scored': job.result_count if final_df is None else len(final_df),
+        'errors': sum(1 for level, _ in job.messages if level == 'error'),
+        'cv_failed': summary['counters'].get('cv_extract_failed', 0),
+        'seconds': round(elapsed, 2),
+        'candidates_per_min': round(size / elapsed * 60, 1),
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_child_rss_mb': peak_rss_mb('children'),
+        'stages': summary['stages'],
+        'counters': summary['counters'],
+    }
+
+def print_report(report):
+    print(f"\n== {report['candidates']} ứng viên: {report['scored']} chấm xong, {report['errors']} lỗi, "
+          f"{report['cv_failed']} CV không trích xuất được, "
+          f"{report['seconds']} giây, {report['candidates_per_min']} ứng viên/phút, "
+          f"peak RSS {report['peak_rss_mb'] if report['peak_rss_mb'] is not None else 'n/a'} MB "
+          f"(process đọc CV: {report['peak_child_rss_mb'] if report['peak_child_rss_mb'] is not None else 'n/a'} MB)")
+    print(f"   Gemini giả: {report['gemini_requests']} request, {report['gemini_429']} lần trả 429")
+    for model, usage in sorted(report['gemini_models'].items()):
+        print(f"   {model}: {usage['requests']} request, ~{usage['prompt_tokens']} token prompt")
+    print(f"   {'giai đoạn':<24}{'số lần':>8}{'p50 (s)':>10}{'p95 (s)':>10}{'tổng (s)':>10}")
+    for stage in REPORT_STAGES:
+        stats = report['stages'].get(stage)
+        if stats:
+            print(f"   {stage:<24}{stats['count']:>8}{stats['p50']:>10}{stats['p95']:>10}{stats['total']:>10}")
+    if report['counters']:
+        print("   " + ', '.join(f"{name}={value}" for name, value in sorted(report['counters'].items())))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo hiệu năng pipeline chấm CV với Base API và Gemini giả lập, không cần mạng. "
+                                                 "Chạy từ thư mục gốc: python -m bench.run")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help="Số ứng viên cho mỗi lần đo")
+    parser.add_argument('--mode', choices=['combined', 'separate', 'batch', 'tiered'], default='combined')
+    parser.add_argument('--latency', type=float, default=0.2, help="Độ trễ trung bình của Gemini giả (giây)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Tỉ lệ request Gemini trả về 429")
+    parser.add_argument('--model-latency', nargs='+', default=[], metavar='MODEL=GIÂY',
+                        help="Độ trễ riêng theo model, VD: gemini-1.5-flash-8b-latest=0.05 khi đo chế độ tiered")
+    parser.add_argument('--rpm', type=int, default=100000, help="Giới hạn request/phút của RateLimiter")
+    parser.add_argument('--tpm', type=int, default=10 ** 9, help="Giới hạn token/phút của RateLimiter")
+    parser.add_argument('--variants', type=int, default=10, help="Số file khác nhau cho mỗi định dạng x cỡ CV")
+    parser.add_argument('--streaming', action='store_true', help="Ghi kết quả thẳng ra file Parquet (so sánh peak RSS)")
+    parser.add_argument('--corpus-dir', help="Thư mục lưu bộ CV giả (mặc định: thư mục tạm)")
+    parser.add_argument('--json', help="Ghi kết quả đo ra file JSON")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='cv-bench-')
+    corpus_dir = args.corpus_dir or os.path.join(workdir, 'corpus')
+    files = build_corpus(corpus_dir, variants=args.variants)
+    base_server, base_url = start_fake_base(corpus_dir, files)
+    model_latency = {name: float(value) for name, value in (item.rsplit('=', 1) for item in args.model_latency)}
+    gemini_server, gemini_url = start_fake_gemini(args.latency, args.error_rate, model_latency)
+    print(f"Corpus: {len(files)} file tại {corpus_dir}; Base giả: {base_url}; Gemini giả: {gemini_url}")
+
+    options = {'mode': args.mode, 'rpm': args.rpm, 'tpm': args.tpm, 'streaming': args.streaming}
+    context = multiprocessing.get_context('spawn')
+    reports = []
+    for size in args.sizes:
+        cache_dir = os.path.join(workdir, f"cache_{size}")
+        requests_before, errors_before = gemini_server.stats['requests'], gemini_server.stats['429']
+        models_before = {model: dict(usage) for model, usage in gemini_server.stats['models'].items()}
+        # ProcessPoolExecutor thay vì multiprocessing.Pool: worker của Pool là daemon nên không tạo được pool đọc CV
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            report = pool.submit(run_size, size, base_url + '/publicapi/v2', gemini_url, cache_dir, options).result()
+        report['gemini_requests'] = gemini_server.stats['requests'] - requests_before
+        report['gemini_429'] = gemini_server.stats['429'] - errors_before
+        report['gemini_models'] = {
+            model: {name: value - models_before.get(model, {}).get(name, 0) for name, value in usage.items()}
+            for model, usage in gemini_server.stats['models'].items()}
+        print_report(report)
+        reports.append(report)
+
+    base_server.shutdown()
+    gemini_server.shutdown()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'options': vars(args), 'reports': reports}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ['streamlit', 'pandas', 'config', 'jobs', 'cache', 'base_api', 'scoring', 'prompts', 'extract', 'prescreen',
+           'dedupe', 'results_io', 'pipeline', 'analyze']
+
+
+def import_time_ms(module):
+    # Thời gian import (cộng dồn cả module con) đo trong một interpreter mới, tức là lúc container còn lạnh
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"], cwd=ROOT,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    for line in reversed(result.stderr.splitlines()):
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module:
+            return round(int(parts[1]) / 1000, 1)
+    return None
+
+def run_app(reruns, cache_dir):
+    # Chạy app.py bằng AppTest trong process riêng (spawn): lần chạy đầu = cold start, các lần sau = rerun
+    # như khi người dùng tương tác. Không gọi Base/Gemini nên không cần mạng.
+    os.environ['CV_CACHE_DIR'] = cache_dir
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    from streamlit.testing.v1 import AppTest
+    preloaded = set(sys.modules)  # AppTest tự nạp một số module (VD: plotly), không tính cho app.py
+
+    app = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=120)
+    app.secrets['GOOGLE_API_KEY'] = 'bench'
+    start = time.perf_counter()
+    app.run()
+    first_run = time.perf_counter() - start
+    rerun_times = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        rerun_times.append(time.perf_counter() - start)
+    heavy = sorted(name for name in ['pandas', 'plotly', 'google.generativeai', 'sklearn', 'pypdf', 'docx', 'bs4']
+                   if name in sys.modules and name not in preloaded)
+    return {
+        'first_run_s': round(first_run, 3),
+        'rerun_p50_s': round(sorted(rerun_times)[len(rerun_times) // 2], 3) if rerun_times else None,
+        'exception': [str(e.value) for e in app.exception],
+        'heavy_modules_loaded': heavy,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo thời gian khởi động: import từng module và lần chạy đầu/rerun của app.py. "
+                                                 "Chạy từ thư mục gốc: python -m bench.startup")
+    parser.add_argument('--modules', nargs='+', default=MODULES, help="Các module cần đo thời gian import")
+    parser.add_argument('--reruns', type=int, default=5, help="Số lần rerun app.py sau lần chạy đầu")
+    parser.add_argument('--json', help="Ghi kết quả đo ra file JSON")
+    args = parser.parse_args(argv)
+
+    imports = {module: import_time_ms(module) for module in args.modules}
+    print(f"{'module':<16}{'import (ms)':>12}")
+    for module, ms in imports.items():
+        print(f"{module:<16}{ms if ms is not None else 'lỗi':>12}")
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        app = pool.submit(run_app, args.reruns, tempfile.mkdtemp(prefix='cv-startup-')).result()
+    print(f"\napp.py: lần chạy đầu {app['first_run_s']} giây, rerun p50 {app['rerun_p50_s']} giây")
+    print(f"Module nặng đã nạp sau khi khởi động: {', '.join(app['heavy_modules_loaded']) or 'không có'}")
+    if app['exception']:
+        print(f"Lỗi khi chạy app.py: {app['exception']}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'imports_ms': imports, 'app': app}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
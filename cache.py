@@ -0,0 +1,156 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import CACHE_DIR, CV_CACHE_MAX_BYTES
+
+
+def open_db(name):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(CACHE_DIR, name), check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+class CVTextCache:
+    # Văn bản CV đã trích xuất, lưu trên đĩa theo URL và theo hash nội dung file.
+    # URL -> hash cho phép bỏ qua cả việc tải lại; hash -> text cho phép bỏ qua pypdf/python-docx
+    # khi cùng một file được tải lên dưới URL khác. Khi vượt max_bytes, xóa các mục ít dùng nhất.
+    # Mỗi URL giữ ETag/Last-Modified và thời điểm kiểm tra gần nhất để tải lại bằng request có điều kiện.
+    def __init__(self, name='cv_text.sqlite', max_bytes=CV_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = open_db(name)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS cv_urls (url TEXT PRIMARY KEY, content_hash TEXT NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS cv_texts (content_hash TEXT PRIMARY KEY, text TEXT NOT NULL, "
+                              "size INTEGER NOT NULL, last_access REAL NOT NULL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS cv_texts_last_access ON cv_texts (last_access)")
+            # Cache tạo từ phiên bản trước chưa có các cột này
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(cv_urls)")}
+            for column, definition in [('etag', 'TEXT'), ('last_modified', 'TEXT'), ('checked_at', 'REAL NOT NULL DEFAULT 0')]:
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE cv_urls ADD COLUMN {column} {definition}")
+
+    def lookup(self, url):
+        # Trả về dict text, etag, last_modified, checked_at của URL, hoặc None nếu chưa có
+        with self.lock:
+            row = self.conn.execute("SELECT t.text, u.etag, u.last_modified, u.checked_at FROM cv_urls u "
+                                    "JOIN cv_texts t ON t.content_hash = u.content_hash WHERE u.url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            with self.conn:
+                self.conn.execute("UPDATE cv_texts SET last_access = ? WHERE content_hash = "
+                                  "(SELECT content_hash FROM cv_urls WHERE url = ?)", (time.time(), url))
+        return {'text': row[0], 'etag': row[1], 'last_modified': row[2], 'checked_at': row[3]}
+
+    def touch(self, url):
+        # Server xác nhận file không đổi (304)
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE cv_urls SET checked_at = ? WHERE url = ?", (time.time(), url))
+
+    def get_by_hash(self, content_hash):
+        with self.lock:
+            row = self.conn.execute("SELECT text FROM cv_texts WHERE content_hash = ?", (content_hash,)).fetchone()
+            if row is None:
+                return None
+            with self.conn:
+                self.conn.execute("UPDATE cv_texts SET last_access = ? WHERE content_hash = ?", (time.time(), content_hash))
+            return row[0]
+
+    def put(self, url, content_hash, text, etag=None, last_modified=None):
+        size = len(text.encode('utf-8'))
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO cv_urls (url, content_hash, etag, last_modified, checked_at) "
+                              "VALUES (?, ?, ?, ?, ?)", (url, content_hash, etag, last_modified, time.time()))
+            self.conn.execute("INSERT OR REPLACE INTO cv_texts (content_hash, text, size, last_access) VALUES (?, ?, ?, ?)",
+                              (content_hash, text, size, time.time()))
+            self._evict()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM cv_texts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for content_hash, size in self.conn.execute("SELECT content_hash, size FROM cv_texts ORDER BY last_access").fetchall():
+            self.conn.execute("DELETE FROM cv_texts WHERE content_hash = ?", (content_hash,))
+            self.conn.execute("DELETE FROM cv_urls WHERE content_hash = ?", (content_hash,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+class ScoreCache:
+    # Phản hồi JSON của Gemini theo key (hash CV, hash JD, hash schema, model), xem scoring.score_cache_key
+    def __init__(self, name='scores.sqlite'):
+        self.lock = threading.Lock()
+        self.conn = open_db(name)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)")
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT response FROM scores WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, response):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO scores (key, response, created) VALUES (?, ?, ?)",
+                              (key, json.dumps(response, ensure_ascii=False), time.time()))
+
+
+class FirstSeen:
+    # Giá trị gặp lần đầu của mỗi khóa (VD: email -> mã ứng viên đầu tiên), lưu trong file SQLite tạm
+    # để chế độ streaming không giữ một dict tăng theo số ứng viên. close() xóa file.
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("DROP TABLE IF EXISTS first_seen")  # File còn lại từ lần chạy bị gián đoạn
+        self.conn.execute("CREATE TABLE first_seen (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def setdefault(self, key, value):
+        self.conn.execute("INSERT OR IGNORE INTO first_seen (key, value) VALUES (?, ?)", (key, value))
+        return self.conn.execute("SELECT value FROM first_seen WHERE key = ?", (key,)).fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class SyncState:
+    # Mốc đồng bộ theo opening/stage: ngày đồng bộ gần nhất và các ứng viên đã được chấm
+    def __init__(self, name='sync.sqlite'):
+        self.lock = threading.Lock()
+        self.conn = open_db(name)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS sync_points (opening_id TEXT, stage_id TEXT, last_sync TEXT NOT NULL, "
+                              "PRIMARY KEY (opening_id, stage_id))")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS synced_candidates (opening_id TEXT, stage_id TEXT, candidate_id TEXT, "
+                              "PRIMARY KEY (opening_id, stage_id, candidate_id))")
+
+    def last_sync(self, opening_id, stage_id):
+        with self.lock:
+            row = self.conn.execute("SELECT last_sync FROM sync_points WHERE opening_id = ? AND stage_id = ?",
+                                    (opening_id, stage_id)).fetchone()
+        return row[0] if row else None
+
+    def synced_ids(self, opening_id, stage_id):
+        with self.lock:
+            rows = self.conn.execute("SELECT candidate_id FROM synced_candidates WHERE opening_id = ? AND stage_id = ?",
+                                     (opening_id, stage_id)).fetchall()
+        return {row[0] for row in rows}
+
+    def mark_synced(self, opening_id, stage_id, candidate_ids, sync_date):
+        # sync_date=None: chỉ ghi nhận các ứng viên đã chấm, không dời mốc ngày đồng bộ
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO synced_candidates (opening_id, stage_id, candidate_id) VALUES (?, ?, ?)",
+                                  [(opening_id, stage_id, str(candidate_id)) for candidate_id in candidate_ids])
+            if sync_date is None:
+                return
+            self.conn.execute("INSERT OR REPLACE INTO sync_points (opening_id, stage_id, last_sync) VALUES (?, ?, ?)",
+                              (opening_id, stage_id, sync_date))
@@ -0,0 +1,112 @@
+import argparse
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from base_api import extract_ids_from_url
+from cache import CVTextCache, ScoreCache, SyncState
+from dedupe import NearDuplicateIndex
+from config import (CV_PARSE_WORKERS, DEDUPE_ENABLED, GEMINI_RPM, GEMINI_TPM, PRESCREEN_THRESHOLD, PRESCREEN_TOP_K,
+                    SCORING_MODE, STREAMING_MODE)
+from extract import configure_parse_pool
+from jobs import Job
+from pipeline import score_opening
+from results_io import parquet_to_csv
+from scoring import RateLimiter, configure_gemini
+
+_resources = {}
+
+
+def init_worker(api_key, workers):
+    # Mỗi process có RateLimiter và pool đọc CV riêng nên quota và số process đọc CV được chia đều cho các worker
+    configure_gemini(api_key)
+    if CV_PARSE_WORKERS > 0:
+        configure_parse_pool(max(1, CV_PARSE_WORKERS // workers))
+    _resources['limiter'] = RateLimiter(max(1, GEMINI_RPM // workers), max(1, GEMINI_TPM // workers))
+    _resources['cv_cache'] = CVTextCache()
+    _resources['score_cache'] = ScoreCache()
+    _resources['sync_state'] = SyncState()
+    _resources['dedupe_index'] = NearDuplicateIndex() if DEDUPE_ENABLED else None
+
+def score_opening_to_csv(candidate_url, access_token, output_dir, scoring_mode, incremental, prescreen_options,
+                         streaming=False):
+    opening_id, stage_id = extract_ids_from_url(candidate_url)
+    job = Job((opening_id, stage_id), candidate_url)
+    final_df = score_opening(job, candidate_url, access_token, _resources['limiter'], _resources['cv_cache'],
+                             _resources['score_cache'], _resources['sync_state'],
+                             scoring_mode=scoring_mode, incremental=incremental,
+                             dedupe_index=_resources['dedupe_index'], streaming=streaming, **prescreen_options)
+    output_path = None
+    if final_df is not None or job.result_count and job.results_path:
+        output_path = os.path.join(output_dir, f"ket_qua_danh_gia_cv_{opening_id}_{stage_id}.csv")
+        if job.results_path:
+            # Chế độ streaming: chuyển file Parquet sang CSV theo từng khối rồi xóa file tạm
+            parquet_to_csv(job.results_path, output_path)
+            os.remove(job.results_path)
+        else:
+            final_df.to_csv(output_path, index=False, encoding='utf-8-sig')
+        with open(os.path.join(output_dir, f"ket_qua_danh_gia_cv_{opening_id}_{stage_id}.metrics.json"), 'w',
+                  encoding='utf-8') as f:
+            f.write(job.metrics.to_json())
+    return candidate_url, output_path, job.result_count, job.messages
+
+def read_urls(args):
+    urls = list(args.urls)
+    if args.urls_file:
+        with open(args.urls_file, encoding='utf-8') as f:
+            urls.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    return urls
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chấm điểm CV hàng loạt cho nhiều opening trên Base (không cần Streamlit).")
+    parser.add_argument('urls', nargs='*', help="URL danh sách ứng viên dạng https://hiring.base.vn/opening/candidates/[opening_id]?stage=[stage_id]")
+    parser.add_argument('--urls-file', help="File chứa mỗi dòng một URL")
+    parser.add_argument('--output-dir', default='.', help="Thư mục ghi file CSV kết quả")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Số process chấm song song")
+    parser.add_argument('--mode', choices=['combined', 'separate', 'batch', 'tiered'], default=SCORING_MODE)
+    parser.add_argument('--incremental', action='store_true', help="Chỉ chấm ứng viên mới kể từ lần đồng bộ trước")
+    parser.add_argument('--prescreen', action='store_true', help="Lọc sơ bộ bằng TF-IDF, chỉ gửi CV phù hợp lên Gemini")
+    parser.add_argument('--top-k', type=int, default=PRESCREEN_TOP_K, help="Số CV tối đa gửi lên Gemini khi lọc sơ bộ")
+    parser.add_argument('--threshold', type=float, default=PRESCREEN_THRESHOLD, help="Ngưỡng tương đồng TF-IDF tối thiểu")
+    parser.add_argument('--streaming', action='store_true', default=STREAMING_MODE,
+                        help="Ghi kết quả thẳng ra file theo từng khối, bộ nhớ không tăng theo số ứng viên")
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv('GOOGLE_API_KEY')
+    access_token = os.getenv('BASE_API_KEY')
+    if not api_key or not access_token:
+        parser.error("Cần đặt biến môi trường GOOGLE_API_KEY và BASE_API_KEY.")
+    urls = read_urls(args)
+    invalid = [url for url in urls if extract_ids_from_url(url) == (None, None)]
+    if not urls or invalid:
+        parser.error(f"URL không hợp lệ: {invalid}" if invalid else "Chưa có URL nào.")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    workers = max(1, min(args.workers, len(urls)))
+    failed = 0
+    prescreen_options = {'prescreen': args.prescreen, 'prescreen_top_k': args.top_k or None,
+                         'prescreen_threshold': args.threshold}
+    # spawn thay vì fork: thư viện Google (gRPC) không an toàn khi fork sau khi đã khởi tạo
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_worker, initargs=(api_key, workers)) as pool:
+        futures = {pool.submit(score_opening_to_csv, url, access_token, args.output_dir, args.mode, args.incremental,
+                               prescreen_options, args.streaming): url
+                   for url in urls}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                _, output_path, scored, messages = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"❌ {url}: {str(e)}", file=sys.stderr)
+                continue
+            for level, text in messages:
+                if level != 'info':
+                    print(text, file=sys.stderr)
+            print(f"✅ {url}: {scored} ứng viên -> {output_path or 'không có kết quả'}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
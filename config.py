@@ -1,4 +1,7 @@
 # config.py
+import os
+
+JD_CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'JD_tc.csv')
 
 cleaned_schema = {
     "type": "object",
@@ -65,3 +68,89 @@ new_schema = {
     },
     "required": ["muc_do_phu_hop", "ky_nang_ky_thuat", "kinh_nghiem", "trinh_do_hoc_van", "ky_nang_mem", "tom_tat"]
 }
+
+# Schema gộp để chấm cả hai phần trong một lần gọi Gemini
+combined_schema = {
+    "type": "object",
+    "properties": {
+        "hard_skill": new_schema,
+        "soft_skill": cleaned_schema
+    },
+    "required": ["hard_skill", "soft_skill"]
+}
+
+# Pipeline tải/trích xuất CV
+CV_DOWNLOAD_WORKERS = 8  # Số luồng tải và đọc CV song song
+CV_PREFETCH_SIZE = 16    # Số CV tối đa đã trích xuất nằm chờ trong hàng đợi chấm điểm
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))  # Số opening được chấm nền đồng thời trong một process
+JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_SECONDS', str(3600)))  # Job đã xong được giữ lại để xem kết quả trong khoảng này
+JOB_MAX_FINISHED = int(os.getenv('JOB_MAX_FINISHED', '20'))  # Số job đã xong tối đa giữ trong bộ nhớ
+CV_PARSE_WORKERS = int(os.getenv('CV_PARSE_WORKERS', str(os.cpu_count() or 1)))  # Số process đọc PDF/DOCX (0 = đọc ngay trên luồng tải)
+CV_PARSE_TIMEOUT = float(os.getenv('CV_PARSE_TIMEOUT', '30'))  # Thời gian tối đa để đọc một CV (giây)
+CV_MAX_PAGES = int(os.getenv('CV_MAX_PAGES', '20'))  # Chỉ đọc tối đa từng này trang của một file PDF
+CV_MAX_BYTES = int(os.getenv('CV_MAX_BYTES', str(20 * 1024 * 1024)))  # Bỏ qua file CV lớn hơn giới hạn này
+
+# Gemini
+GEMINI_MODEL = 'models/gemini-1.5-flash-latest'
+GEMINI_API_ENDPOINT = os.getenv('GEMINI_API_ENDPOINT')  # VD: localhost:8080 để chạy với server Gemini giả lập
+GEMINI_RPM = int(os.getenv('GEMINI_RPM', '15'))           # Số request tối đa mỗi phút
+GEMINI_TPM = int(os.getenv('GEMINI_TPM', '1000000'))      # Số token đầu vào tối đa mỗi phút
+GEMINI_MAX_IN_FLIGHT = int(os.getenv('GEMINI_MAX_IN_FLIGHT', '4'))  # Số CV được chấm đồng thời
+GEMINI_MAX_RETRIES = 5
+GEMINI_BACKOFF_BASE = 1.0  # giây
+GEMINI_BACKOFF_MAX = 30.0  # giây
+# 'combined': một lần gọi/CV với combined_schema, 'separate': hai lần gọi như trước,
+# 'batch': gộp nhiều CV cùng khoảng lương vào một lần gọi, lỗi thì chấm lại từng CV,
+# 'tiered': chấm nhanh bằng model rẻ trước, chỉ ứng viên sát ngưỡng đạt mới được chấm đủ tiêu chí bằng model mạnh hơn
+SCORING_MODE = os.getenv('SCORING_MODE', 'combined')
+GEMINI_BATCH_TOKEN_BUDGET = int(os.getenv('GEMINI_BATCH_TOKEN_BUDGET', '24000'))  # Tổng token CV tối đa trong một request gộp
+GEMINI_BATCH_MAX_CVS = int(os.getenv('GEMINI_BATCH_MAX_CVS', '8'))  # Số CV tối đa trong một request gộp
+# Các model theo thứ tự từ rẻ/nhanh đến mạnh, phân cách bằng dấu phẩy: tầng 1 chấm nhanh, các tầng sau chấm đủ tiêu chí.
+# Để trống thì dùng GEMINI_MODEL
+GEMINI_MODEL_CASCADE = [name.strip() for name in
+                        os.getenv('GEMINI_MODEL_CASCADE', f"models/gemini-1.5-flash-8b-latest,{GEMINI_MODEL}").split(',')
+                        if name.strip()] or [GEMINI_MODEL]
+TIER_MARGIN = float(os.getenv('TIER_MARGIN', '10'))  # Điểm ước lượng cách ngưỡng đạt không quá giá trị này thì chấm lên tầng sau
+TIER1_CV_TOKEN_BUDGET = int(os.getenv('TIER1_CV_TOKEN_BUDGET', '1000'))  # CV được rút gọn hơn ở lượt chấm nhanh
+
+# Ngân sách token cho prompt
+TOKENIZER_ENCODING = 'cl100k_base'  # tiktoken; xấp xỉ số token của Gemini
+CV_TOKEN_BUDGET = int(os.getenv('CV_TOKEN_BUDGET', '3000'))
+JD_TOKEN_BUDGET = int(os.getenv('JD_TOKEN_BUDGET', '2000'))
+
+# Cache trên đĩa
+CACHE_DIR = os.getenv('CV_CACHE_DIR', '.cache')
+CV_CACHE_MAX_BYTES = int(os.getenv('CV_CACHE_MAX_BYTES', str(500 * 1024 * 1024)))  # Giới hạn dung lượng văn bản CV đã cache
+CV_REVALIDATE_SECONDS = int(os.getenv('CV_REVALIDATE_SECONDS', str(24 * 3600)))  # Quá thời gian này thì hỏi lại server (ETag/Last-Modified) trước khi dùng CV đã cache
+RUNS_DIR = os.path.join(CACHE_DIR, 'runs')  # Nhật ký các lần chấm điểm để tiếp tục khi bị gián đoạn
+
+# Chế độ streaming cho opening rất lớn: kết quả ghi thẳng xuống file Parquet theo từng khối thay vì giữ trong bộ nhớ
+STREAMING_MODE = os.getenv('STREAMING_MODE', '0') == '1'
+RESULTS_DIR = os.path.join(CACHE_DIR, 'results')
+RESULT_CHUNK_ROWS = int(os.getenv('RESULT_CHUNK_ROWS', '1000'))  # Số dòng mỗi row group Parquet
+STREAM_PREVIEW_ROWS = 200  # Số kết quả gần nhất giữ trong bộ nhớ để hiển thị tiến độ
+STREAM_METRIC_SAMPLES = 10000  # Số mẫu tối đa mỗi chỉ số (p50/p95) giữ trong bộ nhớ ở chế độ streaming
+
+# HTTP (tải CV và gọi Base API)
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))  # giây
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '30'))       # giây
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '32'))  # Số kết nối keep-alive tối đa giữ lại cho mỗi host
+
+# Base API
+BASE_API_URL = os.getenv('BASE_API_URL', 'https://hiring.base.vn/publicapi/v2')
+BASE_PAGE_SIZE = int(os.getenv('BASE_PAGE_SIZE', '100'))  # Số ứng viên mỗi trang khi gọi candidate/list
+BASE_START_DATE = '2023-11-01'
+JD_CACHE_TTL = int(os.getenv('JD_CACHE_TTL', '600'))  # Số giây văn bản JD của một opening được dùng lại giữa các job/session
+
+# Lọc sơ bộ TF-IDF trước khi gọi Gemini
+PRESCREEN_TOP_K = int(os.getenv('PRESCREEN_TOP_K', '0')) or None  # Chỉ chấm K CV tương đồng nhất (0 = không giới hạn)
+PRESCREEN_THRESHOLD = float(os.getenv('PRESCREEN_THRESHOLD', '0.05'))  # Độ tương đồng cosine tối thiểu
+
+# Phát hiện CV gần trùng (MinHash + LSH)
+DEDUPE_ENABLED = os.getenv('DEDUPE_ENABLED', '1') == '1'
+DEDUPE_NUM_PERM = 128     # Số hàm băm trong chữ ký MinHash
+DEDUPE_BANDS = 16         # Số dải LSH (DEDUPE_NUM_PERM / DEDUPE_BANDS hàng mỗi dải)
+DEDUPE_SHINGLE_SIZE = 5   # Số từ mỗi shingle
+DEDUPE_THRESHOLD = float(os.getenv('DEDUPE_THRESHOLD', '0.9'))  # Độ tương đồng Jaccard ước lượng tối thiểu để coi là cùng CV
+DEDUPE_MAX_BYTES = int(os.getenv('DEDUPE_MAX_BYTES', str(100 * 1024 * 1024)))  # Dung lượng văn bản CV (đã nén) tối đa trong chỉ mục
+DEDUPE_MAX_AGE_DAYS = float(os.getenv('DEDUPE_MAX_AGE_DAYS', '180'))  # CV không được gặp lại trong khoảng này bị xóa khỏi chỉ mục
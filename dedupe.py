@@ -0,0 +1,129 @@
+import hashlib
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from cache import open_db
+from config import (DEDUPE_BANDS, DEDUPE_MAX_AGE_DAYS, DEDUPE_MAX_BYTES, DEDUPE_NUM_PERM, DEDUPE_SHINGLE_SIZE,
+                    DEDUPE_THRESHOLD)
+
+# Hàm băm (a * x + b) mod p cố định theo seed để chữ ký lưu trên đĩa so sánh được giữa các lần chạy
+_PRIME = (1 << 32) + 15
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, 1 << 31, size=DEDUPE_NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, size=DEDUPE_NUM_PERM).astype(np.uint64)
+
+
+def shingles(text, size=DEDUPE_SHINGLE_SIZE):
+    # Các cụm size từ liên tiếp (chữ thường), băm crc32 để có số nguyên ổn định giữa các process
+    words = re.findall(r'\w+', text.lower())
+    if len(words) <= size:
+        return {zlib.crc32(' '.join(words).encode('utf-8'))}
+    return {zlib.crc32(' '.join(words[i:i + size]).encode('utf-8')) for i in range(len(words) - size + 1)}
+
+def minhash(text):
+    values = np.fromiter(shingles(text), dtype=np.uint64)
+    return ((np.outer(_A, values) + _B[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+def lsh_buckets(signature, bands=DEDUPE_BANDS):
+    # Hai CV rơi vào cùng bucket ở ít nhất một dải là ứng viên gần trùng
+    rows = len(signature) // bands
+    return [hashlib.sha1(signature[i * rows:(i + 1) * rows].tobytes()).hexdigest() for i in range(bands)]
+
+
+class NearDuplicateIndex:
+    # Chỉ mục CV gần trùng lưu trên đĩa: chữ ký MinHash, bucket LSH và văn bản của CV đầu tiên trong mỗi nhóm.
+    # CV gần trùng được chấm bằng văn bản của CV đầu tiên nên trúng ScoreCache khi cùng JD, schema và model.
+    # Giống CVTextCache, chỉ mục có giới hạn: CV không được gặp lại sau max_age_days ngày bị xóa, và khi văn bản
+    # (đã nén) vượt max_bytes thì xóa các CV lâu không được gặp nhất.
+    def __init__(self, name='dedupe.sqlite', threshold=DEDUPE_THRESHOLD, max_bytes=DEDUPE_MAX_BYTES,
+                 max_age_days=DEDUPE_MAX_AGE_DAYS):
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self.lock = threading.Lock()
+        self.conn = open_db(name)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS cv_signatures (text_hash TEXT PRIMARY KEY, candidate_id TEXT NOT NULL, "
+                              "signature BLOB NOT NULL, text BLOB NOT NULL, created REAL NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS lsh_buckets (band INTEGER, bucket TEXT, text_hash TEXT, "
+                              "PRIMARY KEY (band, bucket, text_hash))")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS lsh_buckets_text_hash ON lsh_buckets (text_hash)")
+            # Chỉ mục tạo từ phiên bản trước chưa có các cột này
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(cv_signatures)")}
+            if 'size' not in columns:
+                self.conn.execute("ALTER TABLE cv_signatures ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                self.conn.execute("UPDATE cv_signatures SET size = LENGTH(text)")
+            if 'last_access' not in columns:
+                self.conn.execute("ALTER TABLE cv_signatures ADD COLUMN last_access REAL NOT NULL DEFAULT 0")
+                self.conn.execute("UPDATE cv_signatures SET last_access = created")
+            self._evict()
+
+    def match_or_add(self, text, candidate_id):
+        # Trả về (mã ứng viên, văn bản) của CV gần trùng đã có trong chỉ mục, hoặc None và thêm CV này vào chỉ mục
+        candidate_id = str(candidate_id)
+        text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        signature = minhash(text)
+        buckets = lsh_buckets(signature)
+        with self.lock:
+            row = self.conn.execute("SELECT candidate_id, text FROM cv_signatures WHERE text_hash = ?", (text_hash,)).fetchone()
+            if row is not None:
+                self._touch(text_hash)
+                return row[0], zlib.decompress(row[1]).decode('utf-8')
+            match = self._best_match(signature, buckets)
+            if match is not None:
+                return match
+            compressed = zlib.compress(text.encode('utf-8'))
+            now = time.time()
+            with self.conn:
+                self.conn.execute("INSERT INTO cv_signatures (text_hash, candidate_id, signature, text, created, size, last_access) "
+                                  "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                  (text_hash, candidate_id, signature.tobytes(), compressed, now, len(compressed), now))
+                self.conn.executemany("INSERT OR IGNORE INTO lsh_buckets (band, bucket, text_hash) VALUES (?, ?, ?)",
+                                      [(band, bucket, text_hash) for band, bucket in enumerate(buckets)])
+                self._evict()
+        return None
+
+    def _touch(self, text_hash):
+        with self.conn:
+            self.conn.execute("UPDATE cv_signatures SET last_access = ? WHERE text_hash = ?", (time.time(), text_hash))
+
+    def _delete(self, text_hash):
+        self.conn.execute("DELETE FROM cv_signatures WHERE text_hash = ?", (text_hash,))
+        self.conn.execute("DELETE FROM lsh_buckets WHERE text_hash = ?", (text_hash,))
+
+    def _evict(self):
+        # Gọi trong transaction của self.conn
+        expired = self.conn.execute("SELECT text_hash FROM cv_signatures WHERE last_access < ?",
+                                    (time.time() - self.max_age,)).fetchall()
+        for (text_hash,) in expired:
+            self._delete(text_hash)
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM cv_signatures").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for text_hash, size in self.conn.execute("SELECT text_hash, size FROM cv_signatures ORDER BY last_access").fetchall():
+            self._delete(text_hash)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def _best_match(self, signature, buckets):
+        hashes = set()
+        for band, bucket in enumerate(buckets):
+            hashes.update(row[0] for row in self.conn.execute(
+                "SELECT text_hash FROM lsh_buckets WHERE band = ? AND bucket = ?", (band, bucket)))
+        best, best_similarity = None, self.threshold
+        for text_hash in hashes:
+            other = self.conn.execute("SELECT signature FROM cv_signatures WHERE text_hash = ?", (text_hash,)).fetchone()[0]
+            # Tỉ lệ hàm băm trùng nhau là ước lượng độ tương đồng Jaccard giữa hai tập shingle
+            similarity = float(np.mean(np.frombuffer(other, dtype=np.uint32) == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = text_hash, similarity
+        if best is None:
+            return None
+        candidate_id, text = self.conn.execute("SELECT candidate_id, text FROM cv_signatures WHERE text_hash = ?", (best,)).fetchone()
+        self._touch(best)
+        return candidate_id, zlib.decompress(text).decode('utf-8')
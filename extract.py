@@ -0,0 +1,274 @@
+import hashlib
+import multiprocessing
+import multiprocessing.util
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from itertools import islice
+
+from config import (CV_DOWNLOAD_WORKERS, CV_MAX_BYTES, CV_MAX_PAGES, CV_PARSE_TIMEOUT, CV_PARSE_WORKERS,
+                    CV_PREFETCH_SIZE, CV_REVALIDATE_SECONDS)
+from http_client import download
+from metrics import optional_timer
+from resources import SingleFlight
+
+_cv_flight = SingleFlight()
+
+
+def extract_pdf_text(content, max_pages=CV_MAX_PAGES):
+    from pypdf import PdfReader
+    with BytesIO(content) as f:
+        reader = PdfReader(f)
+        text = ' '.join(page.extract_text() or '' for page in islice(reader.pages, max_pages))
+    return ' '.join(text.split()) # Xóa khoảng trắng thừa nếu có
+
+def extract_docx_text(content):
+    from docx import Document
+    with BytesIO(content) as f:
+        document = Document(f)
+        text = '\n'.join(para.text for para in document.paragraphs)
+    return ' '.join(text.split()) # Xóa khoảng trắng thừa nếu có
+
+# Thời gian cộng thêm khi chờ kết quả ở process cha: giới hạn CV_PARSE_TIMEOUT được áp trong worker,
+# process cha chỉ dừng pool khi worker bị treo hẳn (VD: kẹt trong mã C) hoặc khởi động quá chậm
+PARSE_STARTUP_GRACE = 15.0
+
+_parse_workers = CV_PARSE_WORKERS
+_parse_pool = None
+_parse_slots = None
+_parse_pool_lock = threading.Lock()
+
+def configure_parse_pool(workers):
+    # Đổi số process đọc CV trước khi pool được tạo (VD: chia CV_PARSE_WORKERS cho các worker của cli.py)
+    global _parse_workers, _parse_slots
+    with _parse_pool_lock:
+        _parse_workers = workers
+        _parse_slots = None
+
+def _get_parse_pool():
+    # Một pool dùng chung cho cả process; spawn để không fork các thread đang chạy (Streamlit, gRPC).
+    # _parse_slots giới hạn số CV được gửi vào pool bằng số worker để không CV nào phải xếp hàng trong pool.
+    global _parse_pool, _parse_slots
+    with _parse_pool_lock:
+        if _parse_slots is None:
+            _parse_slots = threading.BoundedSemaphore(_parse_workers)
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(max_workers=_parse_workers,
+                                              mp_context=multiprocessing.get_context('spawn'))
+            # Trong process con (CLI, bench) các process con chưa dừng sẽ bị join khi thoát và treo mãi;
+            # Finalize với exitpriority cao chạy trước bước join đó (và trước finalizer của các Queue) để đóng pool
+            multiprocessing.util.Finalize(_parse_pool, _parse_pool.shutdown, exitpriority=100)
+        return _parse_pool, _parse_slots
+
+def shutdown_parse_pool():
+    global _parse_pool
+    with _parse_pool_lock:
+        pool, _parse_pool = _parse_pool, None
+    if pool is not None:
+        pool.shutdown()
+
+def _raise_parse_timeout(signum, frame):
+    raise TimeoutError("Đọc CV quá thời gian cho phép")
+
+def _parse_with_deadline(parser, content, timeout):
+    # Chạy trong worker: đồng hồ chỉ bắt đầu khi worker thật sự đọc CV, không tính thời gian chờ trong pool.
+    # Tác vụ của ProcessPoolExecutor chạy trên main thread của worker nên dùng được SIGALRM (không có trên Windows)
+    if not hasattr(signal, 'setitimer'):
+        return parser(content)
+    previous = signal.signal(signal.SIGALRM, _raise_parse_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return parser(content)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def _discard_parse_pool(pool):
+    # Không hủy riêng được một tác vụ đang chạy nên dừng cả pool để giải phóng worker bị treo;
+    # lần gọi sau sẽ tạo pool mới
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is pool:
+            _parse_pool = None
+    for process in list((pool._processes or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def parse_cv(parser, content, timeout=CV_PARSE_TIMEOUT):
+    # pypdf/python-docx tốn CPU và giữ GIL nên được chạy trên process pool, có giới hạn dung lượng và thời gian
+    if len(content) > CV_MAX_BYTES:
+        raise ValueError(f"File CV {len(content)} byte vượt quá giới hạn {CV_MAX_BYTES} byte")
+    if _parse_workers <= 0:
+        return parser(content)
+    for attempt in range(2):
+        pool, slots = _get_parse_pool()
+        with slots:
+            try:
+                future = pool.submit(_parse_with_deadline, parser, content, timeout)
+                return future.result(timeout=timeout + PARSE_STARTUP_GRACE)
+            except FutureTimeoutError:
+                _discard_parse_pool(pool)
+                raise TimeoutError(f"Đọc CV quá {timeout} giây")
+            except BrokenProcessPool:
+                # Pool bị dừng vì một CV khác bị treo hoặc worker chết: thử lại một lần với pool mới
+                _discard_parse_pool(pool)
+                if attempt:
+                    raise
+
+# Hàm kiểm tra định dạng file và chọn hàm tương ứng
+def get_cv_parser(cv_url):
+    if not isinstance(cv_url, str):
+        print(f"Invalid URL format: {cv_url}. Expected string, got {type(cv_url)}.")
+        return None
+
+    cv_url = cv_url.strip()  # Remove any leading/trailing whitespace
+
+    if not cv_url:  # Check if the URL is empty after stripping
+        print("Empty URL provided.")
+        return None
+
+    if cv_url.lower().endswith('.pdf'):
+        return extract_pdf_text
+    elif cv_url.lower().endswith('.docx'):
+        return extract_docx_text
+    else:
+        print(f"Unsupported file format for URL: {cv_url}")
+        return None
+
+def get_cv_text_from_url(cv_url, cache=None, metrics=None, key=None):
+    # Trả về (text, cache_hit). cache_hit là True khi không cần tải lại file.
+    # metrics (metrics.RunMetrics) ghi thời gian tải, kích thước file và thời gian trích xuất theo key.
+    # Nhiều job cùng cần một CV một lúc thì chỉ tải và trích xuất một lần, các job còn lại dùng chung kết quả.
+    parser = get_cv_parser(cv_url)
+    if parser is None:
+        return None, False
+    cv_url = cv_url.strip()
+    (text, cache_hit), shared = _cv_flight.do(cv_url, lambda: _get_cv_text(cv_url, parser, cache, metrics, key))
+    if shared:
+        if metrics is not None:
+            metrics.incr('cv_coalesced')
+        return text, True
+    return text, cache_hit
+
+def _get_cv_text(cv_url, parser, cache, metrics, key):
+    entry = cache.lookup(cv_url) if cache is not None else None
+    if entry is not None and time.time() - entry['checked_at'] < CV_REVALIDATE_SECONDS:
+        return entry['text'], True
+    try:
+        # Bản cache đã cũ: gửi kèm ETag/Last-Modified, server trả 304 nếu file không đổi
+        etag, last_modified = (entry['etag'], entry['last_modified']) if entry is not None else (None, None)
+        with optional_timer(metrics, 'cv_download_s', key):
+            content, etag, last_modified = download(cv_url, etag, last_modified)
+        if content is None:
+            if metrics is not None:
+                metrics.incr('cv_not_modified')
+            cache.touch(cv_url)
+            return entry['text'], True
+        if metrics is not None:
+            metrics.observe('cv_bytes', len(content), key)
+        content_hash = hashlib.sha256(content).hexdigest()
+        text = cache.get_by_hash(content_hash) if cache is not None else None
+        if text is None:
+            with optional_timer(metrics, 'cv_parse_s', key):
+                text = parse_cv(parser, content)
+        if cache is not None:
+            cache.put(cv_url, content_hash, text, etag, last_modified)
+        return text, False
+    except Exception as e:
+        print(f"Lỗi khi tải hoặc trích xuất văn bản từ URL {cv_url}: {str(e)}")
+        if entry is not None:
+            # Không kiểm tra lại được (lỗi mạng, link CV đã hết hạn, 4xx...): dùng tiếp văn bản đã cache
+            if metrics is not None:
+                metrics.incr('cv_stale_fallback')
+            return entry['text'], True
+        return None, False
+
+
+_DONE = object()
+
+class CVPrefetcher:
+    # Tải và trích xuất CV trên một thread pool, đẩy kết quả vào một hàng đợi có giới hạn.
+    # Giai đoạn chấm điểm lặp qua đối tượng này để lấy (row, cv_text) theo thứ tự hoàn thành,
+    # nhờ đó thời gian tải/đọc CV chồng lên thời gian gọi Gemini.
+    # rows có thể là generator (VD: danh sách ứng viên theo từng trang); total tăng dần khi đọc rows.
+    # Phải gọi close() khi bên chấm điểm dừng giữa chừng (VD: lỗi), nếu không các thread sẽ chờ mãi.
+    def __init__(self, rows, cache=None, max_workers=CV_DOWNLOAD_WORKERS, prefetch=CV_PREFETCH_SIZE, metrics=None):
+        self.rows = rows
+        self.cache = cache
+        self.metrics = metrics
+        self.total = 0
+        self.done = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.error = None
+        self._queue = queue.Queue(maxsize=prefetch)
+        # Số ứng viên đã lấy từ rows nhưng chưa được bên chấm điểm nhận: đang tải/đọc hoặc nằm trong hàng đợi.
+        # Không có giới hạn này ThreadPoolExecutor sẽ nhận hết rows ngay và giữ mọi ứng viên trong bộ nhớ.
+        self._slots = threading.Semaphore(max_workers + prefetch)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._produce, args=(max_workers,), daemon=True)
+        self._thread.start()
+
+    def _extract(self, row):
+        try:
+            cv_text, cache_hit = get_cv_text_from_url(row['cvs'], self.cache, self.metrics, row.get('id'))
+        except Exception as e:
+            print(f"Lỗi khi trích xuất CV {row.get('cvs')}: {str(e)}")
+            cv_text, cache_hit = None, False
+        with self._lock:
+            self.done += 1
+            if self.cache is not None:
+                if cache_hit:
+                    self.cache_hits += 1
+                else:
+                    self.cache_misses += 1
+        # put() chặn khi hàng đợi đầy, giữ số CV đã tải trước trong giới hạn; thôi chờ khi close()
+        while not self._stop.is_set():
+            try:
+                self._queue.put((row, cv_text), timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _produce(self, max_workers):
+        pool = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            for row in self.rows:
+                self._slots.acquire()
+                if self._stop.is_set():
+                    break
+                with self._lock:
+                    self.total += 1
+                pool.submit(self._extract, row)
+        except Exception as e:
+            self.error = e
+        finally:
+            # Sau close(): bỏ các CV chưa bắt đầu tải, chỉ chờ các CV đang tải xong
+            pool.shutdown(cancel_futures=self._stop.is_set())
+            self._queue.put(_DONE)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is _DONE:
+                if self.error is not None:
+                    raise self.error
+                return
+            self._slots.release()
+            yield item
+
+    def close(self):
+        # Dừng thread đọc rows và các thread tải CV; gọi được nhiều lần, kể cả khi đã lặp hết
+        self._stop.set()
+        self._slots.release()  # Thread đọc rows đang chờ slot sẽ thấy cờ dừng
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
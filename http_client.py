@@ -0,0 +1,51 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import CV_MAX_BYTES, HTTP_CONNECT_TIMEOUT, HTTP_POOL_SIZE, HTTP_READ_TIMEOUT
+
+TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+CHUNK_SIZE = 64 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    # Một Session dùng chung cho cả process để giữ kết nối keep-alive theo từng host
+    # giữa các lần tải CV và gọi Base API (mỗi host một pool tối đa HTTP_POOL_SIZE kết nối)
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+def post(url, data, headers=None):
+    return get_session().post(url, data=data, headers=headers, timeout=TIMEOUT)
+
+def download(url, etag=None, last_modified=None, max_bytes=CV_MAX_BYTES):
+    # Tải file theo từng chunk và dừng ngay khi vượt max_bytes.
+    # Trả về (content, etag, last_modified); content là None khi server trả 304 (file không đổi so với bản đã có).
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    with get_session().get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+        if response.status_code == 304:
+            return None, etag, last_modified
+        response.raise_for_status()
+        length = response.headers.get('Content-Length')
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise ValueError(f"File {length} byte vượt quá giới hạn {max_bytes} byte")
+        content = bytearray()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            content += chunk
+            if len(content) > max_bytes:
+                raise ValueError(f"File vượt quá giới hạn {max_bytes} byte")
+        return bytes(content), response.headers.get('ETag'), response.headers.get('Last-Modified')
@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from config import JOB_MAX_FINISHED, JOB_RETENTION_SECONDS, JOB_WORKERS
+from metrics import RunMetrics
+
+
+class Job:
+    # Trạng thái một lần chấm điểm. Pipeline cập nhật các trường này từ worker thread,
+    # giao diện chỉ đọc để hiển thị tiến độ và kết quả từng phần.
+    def __init__(self, key, label):
+        self.id = uuid.uuid4().hex[:8]
+        self.key = key
+        self.label = label
+        self.status = 'queued'  # queued | running | done | failed
+        self.created = time.time()
+        self.finished_at = None
+        self.total = 0
+        self.downloaded = 0
+        self.scored = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.results = []  # Ở chế độ streaming chỉ giữ các kết quả gần nhất, xem pipeline.score_opening
+        self.result_count = 0
+        self.cached_results = 0
+        self.messages = []  # (level, text) với level là 'info' | 'warning' | 'error'
+        self.final_df = None
+        self.results_path = None  # File Parquet kết quả ở chế độ streaming
+        self.error = None
+        self.metrics = RunMetrics()
+
+    def log(self, level, text):
+        self.messages.append((level, text))
+
+    def add_result(self, uv):
+        self.results.append(uv)
+        self.result_count += 1
+        if uv.get('Kết quả từ cache'):
+            self.cached_results += 1
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+
+class JobManager:
+    # Chạy các job trên worker thread riêng để không chặn script thread của Streamlit.
+    # Phần việc nặng là chờ mạng/Gemini nên dùng thread; mỗi job tự có thread pool tải CV và chấm điểm.
+    # Job đã xong được giữ retention giây (tối đa max_finished job) rồi bị xóa để giải phóng kết quả và metrics;
+    # session giữ job_id của job đã bị xóa sẽ nhận None từ get().
+    def __init__(self, max_workers=JOB_WORKERS, retention=JOB_RETENTION_SECONDS, max_finished=JOB_MAX_FINISHED):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='cv-job')
+        self._lock = threading.Lock()
+        self.retention = retention
+        self.max_finished = max_finished
+        self.jobs = {}
+
+    def submit(self, key, label, fn, *args, **kwargs):
+        # Mỗi key (opening/stage) chỉ có một job đang chạy; gửi lại trả về job hiện có
+        with self._lock:
+            self._prune()
+            for job in self.jobs.values():
+                if job.key == key and not job.finished:
+                    return job
+            job = Job(key, label)
+            self.jobs[job.id] = job
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = 'running'
+        try:
+            job.final_df = fn(job, *args, **kwargs)
+            job.status = 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.log('error', f"❌ Lỗi khi chạy job: {str(e)}")
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self):
+        finished = sorted((job for job in self.jobs.values() if job.finished and job.finished_at is not None),
+                          key=lambda job: job.finished_at, reverse=True)
+        now = time.time()
+        for i, job in enumerate(finished):
+            if i >= self.max_finished or now - job.finished_at > self.retention:
+                del self.jobs[job.id]
+                if job.results_path:
+                    # File kết quả của chế độ streaming và bản CSV do phiên bản trước tạo cạnh nó khi tải xuống
+                    for path in (job.results_path, os.path.splitext(job.results_path)[0] + '.csv'):
+                        if os.path.exists(path):
+                            os.remove(path)
+
+    def get(self, job_id):
+        with self._lock:
+            self._prune()
+            return self.jobs.get(job_id)
@@ -0,0 +1,60 @@
+import json
+import os
+
+from config import RUNS_DIR
+
+
+class RunJournal:
+    # Nhật ký của một lần chấm điểm theo opening/stage: mỗi ứng viên chấm xong được ghi ngay xuống đĩa
+    # (một dòng JSON, flush + fsync) theo mã ứng viên Base. Lần chạy bị gián đoạn sẽ đọc lại nhật ký và
+    # chỉ chấm các ứng viên còn thiếu. Nhật ký được xóa khi lần chạy hoàn tất.
+    # keep_results=False (chế độ streaming): chỉ giữ mã ứng viên trong bộ nhớ, kết quả đọc lại từ file khi cần.
+    def __init__(self, opening_id, stage_id, directory=RUNS_DIR, keep_results=True):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{opening_id}_{stage_id}.jsonl")
+        self.keep_results = keep_results
+        self.ids = set()
+        self.entries = {}
+        for record in self.iter_records():
+            self.ids.add(record['id'])
+            if keep_results:
+                self.entries[record['id']] = record['result']
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def iter_records(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Dòng cuối có thể bị ghi dở khi tiến trình dừng đột ngột
+
+    def __contains__(self, candidate_id):
+        return str(candidate_id) in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def record(self, candidate_id, result, candidate=None):
+        # candidate: thông tin ứng viên từ Base, lưu kèm để chế độ streaming dựng lại dòng kết quả khi tiếp tục
+        candidate_id = str(candidate_id)
+        record = {'id': candidate_id, 'result': result}
+        if candidate is not None:
+            record['candidate'] = candidate
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.ids.add(candidate_id)
+        if self.keep_results:
+            self.entries[candidate_id] = result
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def complete(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,91 @@
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+
+class RunMetrics:
+    # Số liệu của một lần chấm: thời gian từng giai đoạn, kích thước phản hồi, token và số lần retry.
+    # Các giai đoạn chạy trên nhiều thread nên mọi thao tác ghi đều đi qua lock.
+    # max_samples: giữ tối đa từng này mẫu mỗi tên (lấy mẫu ngẫu nhiên, p50/p95 là ước lượng; count/total vẫn chính xác)
+    # per_candidate=False: không ghi số liệu theo từng ứng viên. Dùng cho chế độ streaming để bộ nhớ không tăng theo số ứng viên.
+    def __init__(self, max_samples=None, per_candidate=True):
+        self.started = time.time()
+        self.finished = None
+        self.samples = {}     # tên -> danh sách giá trị (giây, byte hoặc token)
+        self.totals = {}      # tên -> [số lần, tổng giá trị]
+        self.counters = {}    # tên -> tổng số lần
+        self.candidates = {}  # mã ứng viên -> {tên: tổng giá trị}
+        self.max_samples = max_samples
+        self.per_candidate = per_candidate
+        self._lock = threading.Lock()
+
+    def bound(self, max_samples):
+        with self._lock:
+            self.max_samples = max_samples
+            self.per_candidate = False
+            self.candidates = {}
+
+    def observe(self, name, value, key=None):
+        with self._lock:
+            total = self.totals.setdefault(name, [0, 0])
+            total[0] += 1
+            total[1] += value
+            values = self.samples.setdefault(name, [])
+            if self.max_samples is None or len(values) < self.max_samples:
+                values.append(value)
+            else:
+                # Reservoir sampling: mọi giá trị có cùng xác suất nằm trong mẫu
+                i = random.randrange(total[0])
+                if i < self.max_samples:
+                    values[i] = value
+            if key is not None and self.per_candidate:
+                per_candidate = self.candidates.setdefault(str(key), {})
+                per_candidate[name] = per_candidate.get(name, 0) + value
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def finish(self):
+        self.finished = time.time()
+
+    @contextmanager
+    def timer(self, name, key=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, key)
+
+    def summary(self):
+        import numpy as np
+        with self._lock:
+            samples = {name: list(values) for name, values in self.samples.items()}
+            totals = {name: list(total) for name, total in self.totals.items()}
+            counters = dict(self.counters)
+        stages = {}
+        for name, values in samples.items():
+            values = np.asarray(values, dtype=float)
+            stages[name] = {
+                'count': totals[name][0],
+                'total': round(float(totals[name][1]), 4),
+                'p50': round(float(np.percentile(values, 50)), 4),
+                'p95': round(float(np.percentile(values, 95)), 4),
+            }
+        return {'wall_s': round((self.finished or time.time()) - self.started, 3), 'stages': stages, 'counters': counters}
+
+    def to_json(self):
+        with self._lock:
+            candidates = {key: dict(values) for key, values in self.candidates.items()}
+        return json.dumps(dict(self.summary(), candidates=candidates), ensure_ascii=False, indent=2)
+
+
+def optional_timer(metrics, name, key=None):
+    # Cho phép các hàm nhận metrics=None mà không phải rẽ nhánh ở mọi chỗ đo
+    return metrics.timer(name, key) if metrics is not None else _noop()
+
+@contextmanager
+def _noop():
+    yield
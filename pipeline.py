@@ -0,0 +1,290 @@
+import os
+import re
+from collections import deque
+from datetime import date
+from html import unescape
+
+import pandas as pd
+
+from base_api import extract_ids_from_url, get_jd, iter_candidate_pages
+from cache import FirstSeen
+from config import (BASE_START_DATE, JD_TOKEN_BUDGET, PRESCREEN_THRESHOLD, PRESCREEN_TOP_K, RESULTS_DIR,
+                    SCORING_MODE, STREAM_METRIC_SAMPLES, STREAM_PREVIEW_ROWS, STREAMING_MODE)
+from extract import CVPrefetcher
+from journal import RunJournal
+from prescreen import select_candidates, tfidf_similarity
+from prompts import compact_text
+from results_io import ResultWriter
+from rubric import load_rubric
+from scoring import ScoringEngine, batch_cvs, evaluate_batch, evaluate_candidate, evaluate_tiered, screened_out_result
+
+CANDIDATE_COLUMNS = ['id', 'name', 'email', 'status', 'cvs', 'expect_salary']
+CANDIDATE_RENAME = {
+    'id': 'Mã ứng viên',
+    'name': "Tên ứng viên",
+    'email': 'Email',
+    'expect_salary': "Mức lương mong muốn",
+    'status': 'Trạng thái',
+    'cvs': 'Link CV',
+}
+DUPLICATE_COLUMN = 'Trùng với ứng viên'
+
+
+def extract_salary(fields):
+    for field in fields:
+        if field.get('id') == 'muc_luong_mong_muon':
+            salary = extract_numeric_salary(field.get('value', '0'))
+            return salary if salary is not None else -1
+    return -1  # Return 0 if 'muc_luong_mong_muon' field is not found
+
+def extract_numeric_salary(salary):
+    if not salary:
+        return 0
+    match = re.search(r'(\d{1,3}(?:,\d{3})*)', str(salary))
+    return int(match.group(1).replace(',', '')) if match else -1
+
+def process_data(data, rubric=None):
+    if 'candidates' not in data:
+        print("Không tìm thấy ứng viên trong phản hồi.")
+        return None
+    df = pd.DataFrame(data['candidates'])
+
+    df['cvs'] = df['cvs'].apply(lambda x: x[0] if len(x) > 0 else None)
+    df['cvs'] = df['cvs'].astype(str)
+    df['title'] = df['title'].apply(lambda x: re.sub(r'<.*?>', '', x) if isinstance(x, str) else x)
+    df['name'] = df['name'].apply(lambda x: unescape(x))
+    df['expect_salary'] = df['form'].apply(extract_salary)
+
+    # Filter rows where 'cvs' is not None or "None"
+    df = df[df['cvs'].notnull() & (df['cvs'] != "None")]
+
+    selected_df = df[CANDIDATE_COLUMNS]
+    if rubric is not None:
+        # Xếp vị trí cho cả trang ứng viên trong một lượt searchsorted
+        selected_df = selected_df.assign(position_index=rubric.bucket(selected_df['expect_salary'].to_numpy()))
+
+    return selected_df
+
+def build_final_df(data, results):
+    # Ghép theo mã ứng viên Base thay vì tên: hai ứng viên trùng tên không làm nhân đôi số dòng
+    df_results = pd.DataFrame(results).drop(columns=['Tên ứng viên']).drop_duplicates('Mã ứng viên', keep='last')
+    data = data.assign(id=data['id'].astype(str)).drop_duplicates('id')
+    final_df = pd.merge(data, df_results, left_on='id', right_on='Mã ứng viên', how='inner')
+    final_df.drop(columns=['Mã ứng viên'], inplace=True)
+    # Cùng email nộp nhiều lần: đánh dấu trùng với lần nộp đầu tiên (nếu chưa được đánh dấu trùng CV)
+    emails = final_df['email'].fillna('').astype(str).str.strip().str.lower()
+    first_id = final_df.groupby(emails)['id'].transform('first')
+    same_email = emails.ne('') & first_id.ne(final_df['id'])
+    duplicate_of = final_df[DUPLICATE_COLUMN] if DUPLICATE_COLUMN in final_df else pd.Series(None, index=final_df.index, dtype=object)
+    final_df[DUPLICATE_COLUMN] = duplicate_of.where(duplicate_of.notna(), first_id.where(same_email))
+    final_df.rename(columns=CANDIDATE_RENAME, inplace=True)
+    return final_df
+
+def output_row(candidate, uv):
+    # Một dòng kết quả giống build_final_df nhưng dựng cho từng ứng viên (chế độ streaming)
+    row = {CANDIDATE_RENAME[column]: candidate.get(column) for column in CANDIDATE_COLUMNS}
+    row['Mã ứng viên'] = str(row['Mã ứng viên'])
+    row.update((key, value) for key, value in uv.items() if key not in ('Mã ứng viên', 'Tên ứng viên'))
+    return row
+
+def prescreen_cvs(job, cvs, jd2, rubric, top_k, threshold):
+    # Vòng lọc sơ bộ cần toàn bộ CV để xếp hạng nên chờ giai đoạn trích xuất xong rồi mới chấm.
+    # Trả về (danh sách CV được gửi lên Gemini, danh sách CV bị loại, độ tương đồng theo mã ứng viên).
+    cvs = list(cvs)
+    with job.metrics.timer('prescreen_s'):
+        similarities = tfidf_similarity([cv_text for _, cv_text in cvs], [jd2] + rubric.descriptions)
+        keep = select_candidates(similarities, top_k=top_k, threshold=threshold)
+    similarity_by_id = {row['id']: round(float(value), 4) for (row, _), value in zip(cvs, similarities)}
+    selected = [cv for cv, kept in zip(cvs, keep) if kept]
+    rejected = [cv for cv, kept in zip(cvs, keep) if not kept]
+    job.log('info', f"🧮 Lọc sơ bộ TF-IDF: {len(selected)}/{len(cvs)} CV được gửi lên Gemini để chấm.")
+    return selected, rejected, similarity_by_id
+
+def score_opening(job, candidate_url, access_token, limiter, cv_cache, score_cache, sync_state,
+                  scoring_mode=SCORING_MODE, incremental=False, prescreen=False,
+                  prescreen_top_k=PRESCREEN_TOP_K, prescreen_threshold=PRESCREEN_THRESHOLD, dedupe_index=None,
+                  streaming=STREAMING_MODE):
+    # Toàn bộ luồng lấy ứng viên -> tải CV -> chấm điểm cho một opening/stage, không phụ thuộc Streamlit.
+    # Tiến độ, thông báo và kết quả từng phần được ghi vào job (xem jobs.Job).
+    # streaming=True: bộ nhớ không tăng theo số ứng viên. Không giữ danh sách ứng viên, kết quả hay final_df;
+    # mỗi kết quả được ghi ngay vào file Parquet job.results_path và hàm trả về None.
+    opening_id, stage_id = extract_ids_from_url(candidate_url)
+    sync_date = date.today().isoformat()
+    start_date = BASE_START_DATE
+    synced_ids = set()
+    if incremental:
+        # Chỉ lấy và chấm các ứng viên mới kể từ lần đồng bộ trước của opening/stage này
+        start_date = sync_state.last_sync(opening_id, stage_id) or BASE_START_DATE
+        synced_ids = sync_state.synced_ids(opening_id, stage_id)
+    fetched = []
+    fetched_count = 0
+    journal = RunJournal(opening_id, stage_id, keep_results=not streaming)
+    if len(journal):
+        job.log('info', f"⏯️ Tiếp tục lần chạy trước: {len(journal)} ứng viên đã được chấm sẽ không chấm lại.")
+    writer = first_by_email = None
+    if streaming:
+        job.results = deque(maxlen=STREAM_PREVIEW_ROWS)
+        job.metrics.bound(STREAM_METRIC_SAMPLES)
+        writer = ResultWriter(os.path.join(RESULTS_DIR, f"{opening_id}_{stage_id}_{job.id}.parquet"))
+        first_by_email = FirstSeen(os.path.join(RESULTS_DIR, f"{opening_id}_{stage_id}.emails.sqlite"))
+        if prescreen:
+            prescreen = False
+            job.log('info', "ℹ️ Chế độ streaming không dùng lọc sơ bộ TF-IDF vì lọc sơ bộ cần giữ toàn bộ CV trong bộ nhớ.")
+
+    def candidate_rows():
+        # Ứng viên được đưa vào pipeline ngay khi từng trang từ Base API về
+        nonlocal fetched_count
+        for page in iter_candidate_pages(opening_id, stage_id, access_token, start_date=start_date,
+                                         metrics=job.metrics):
+            page_df = process_data({'candidates': page}, rubric)
+            if page_df is None:
+                continue
+            for row in page_df.to_dict('records'):
+                if str(row['id']) in synced_ids:
+                    continue
+                fetched_count += 1
+                if not streaming:
+                    fetched.append(row)
+                if row['id'] in journal:
+                    continue
+                yield row
+
+    rubric = load_rubric()
+    jd2 = compact_text(get_jd(candidate_url, access_token, job.metrics), JD_TOKEN_BUDGET)
+
+    def write_row(candidate, uv):
+        row = output_row(candidate, uv)
+        # Cùng email nộp nhiều lần: đánh dấu trùng với lần nộp đầu tiên như build_final_df
+        email = str(candidate.get('email') or '').strip().lower()
+        if email:
+            first_id = first_by_email.setdefault(email, row['Mã ứng viên'])
+            if row.get(DUPLICATE_COLUMN) is None and first_id != row['Mã ứng viên']:
+                row[DUPLICATE_COLUMN] = first_id
+        writer.append(row)
+
+    if streaming:
+        for record in journal.iter_records():
+            uv = record['result']
+            job.add_result(uv)
+            write_row(record.get('candidate') or {'id': record['id'], 'name': uv.get('Tên ứng viên')}, uv)
+    else:
+        for candidate_id, uv in journal.entries.items():
+            uv.setdefault('Mã ứng viên', candidate_id)  # Nhật ký ghi từ phiên bản trước chưa có mã ứng viên
+            job.add_result(uv)
+    scored_ids = list(journal.ids)
+
+    # CV được tải và trích xuất trước trên thread pool, ScoringEngine chấm song song trong giới hạn quota
+    prefetcher = CVPrefetcher(candidate_rows(), cache=cv_cache, metrics=job.metrics)
+    engine = ScoringEngine()
+    skipped = 0
+    failed = 0  # Ứng viên lỗi tải/trích xuất CV hoặc lỗi khi chấm: lần đồng bộ sau phải lấy lại
+
+    def extracted_cvs():
+        nonlocal skipped, failed
+        for row, cv_text in prefetcher:
+            job.total, job.downloaded = prefetcher.total, prefetcher.done
+            if cv_text:
+                yield row, cv_text
+            else:
+                skipped += 1
+                failed += 1
+                job.metrics.incr('cv_extract_failed')
+                job.log('warning', f"⚠️ Không trích xuất được nội dung CV từ {row['cvs']}")
+
+    def deduplicated(cvs):
+        # CV gần trùng với một CV đã gặp (ở lần chạy này hoặc các lần trước) được chấm bằng văn bản của CV đó,
+        # nên trúng ScoreCache và không gọi lại Gemini khi cùng JD
+        for row, cv_text in cvs:
+            with job.metrics.timer('dedupe_s', row['id']):
+                match = dedupe_index.match_or_add(cv_text, row['id'])
+            if match is not None:
+                original_id, cv_text = match
+                if original_id != str(row['id']):
+                    duplicate_of[row['id']] = original_id
+                    job.metrics.incr('cv_near_duplicates')
+            yield row, cv_text
+
+    def record(row, uv):
+        if row['id'] in similarity_by_id:
+            uv['Độ tương đồng TF-IDF'] = similarity_by_id[row['id']]
+        if row['id'] in duplicate_of:
+            uv[DUPLICATE_COLUMN] = duplicate_of[row['id']]
+        if streaming:
+            candidate = {column: row[column] for column in CANDIDATE_COLUMNS}
+            journal.record(row['id'], uv, candidate)
+            write_row(candidate, uv)
+        else:
+            journal.record(row['id'], uv)
+        job.add_result(uv)
+        scored_ids.append(row['id'])
+
+    similarity_by_id = {}
+    duplicate_of = {}
+    try:
+        cvs = extracted_cvs()
+        if dedupe_index is not None:
+            cvs = deduplicated(cvs)
+        if prescreen:
+            cvs, rejected, similarity_by_id = prescreen_cvs(job, cvs, jd2, rubric, prescreen_top_k, prescreen_threshold)
+            for row, _ in rejected:
+                record(row, screened_out_result(row, rubric))
+                skipped += 1
+        if scoring_mode == 'batch':
+            # Mỗi item là một nhóm CV cùng khoảng lương, chấm bằng một request gộp
+            items = ((batch, jd2, rubric, limiter, score_cache, job.metrics) for batch in batch_cvs(cvs, rubric))
+            fn = evaluate_batch
+        elif scoring_mode == 'tiered':
+            # Chấm nhanh bằng model rẻ, chỉ ứng viên sát ngưỡng đạt mới được chấm lại bằng model mạnh hơn
+            items = ((row, cv_text, jd2, rubric, limiter, score_cache, job.metrics) for row, cv_text in cvs)
+            fn = evaluate_tiered
+        else:
+            items = ((row, cv_text, jd2, rubric, limiter, scoring_mode, score_cache, job.metrics)
+                     for row, cv_text in cvs)
+            fn = evaluate_candidate
+        scored = 0
+        for item, result, error in engine.score_stream(items, fn):
+            if scoring_mode != 'batch':
+                outcomes = [(item[0], result, error)]
+            elif error:
+                outcomes = [(row, None, error) for row, _ in item[0]]
+            else:
+                outcomes, warning = result
+                if warning:
+                    job.log('warning', warning)
+            for row, uv, error in outcomes:
+                if error:
+                    job.log('error', f"❌ Lỗi khi xử lý CV từ {row['cvs']}: {str(error)}")
+                    failed += 1
+                else:
+                    record(row, uv)
+                scored += 1
+            job.scored = scored + skipped
+    finally:
+        prefetcher.close()
+        engine.shutdown()
+        journal.close()
+        if writer is not None:
+            writer.close()
+            first_by_email.close()
+        job.metrics.finish()
+    journal.complete()
+    job.total, job.downloaded, job.scored = prefetcher.total, prefetcher.done, prefetcher.total
+    job.cache_hits, job.cache_misses = prefetcher.cache_hits, prefetcher.cache_misses
+
+    if duplicate_of:
+        job.log('info', f"🔁 {len(duplicate_of)} CV gần trùng với CV đã gặp trước đó, được chấm lại bằng kết quả đã có khi cùng JD.")
+    # Còn ứng viên lỗi thì giữ nguyên mốc ngày đồng bộ để lần sau vẫn lấy lại họ;
+    # các ứng viên đã chấm được bỏ qua nhờ synced_ids
+    sync_state.mark_synced(opening_id, stage_id, scored_ids, None if failed else sync_date)
+    if failed and incremental:
+        job.log('info', f"ℹ️ {failed} ứng viên lỗi sẽ được lấy và chấm lại ở lần đồng bộ sau.")
+    if streaming:
+        job.results_path = writer.path
+        job.log('info', f"✅ Đã lấy thông tin {fetched_count} ứng viên thành công! "
+                        f"{writer.count} kết quả được ghi vào {writer.path}")
+        return None
+    data = pd.DataFrame(fetched, columns=CANDIDATE_COLUMNS)
+    job.log('info', f"✅ Đã lấy thông tin {len(data)} ứng viên thành công!")
+    if not job.results:
+        return None
+    return build_final_df(data, job.results)
@@ -0,0 +1,26 @@
+import numpy as np
+
+
+def tfidf_similarity(cv_texts, jd_texts):
+    # Một lần fit TF-IDF cho toàn bộ CV và JD; mỗi CV lấy độ tương đồng cosine cao nhất với các JD.
+    # Vector TF-IDF đã chuẩn hóa L2 nên tích vô hướng chính là cosine.
+    if not cv_texts:
+        return np.zeros(0)
+    # scikit-learn mất khoảng hai giây để import nên chỉ nạp khi bật lọc sơ bộ
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import linear_kernel
+    vectorizer = TfidfVectorizer(sublinear_tf=True, ngram_range=(1, 2))
+    matrix = vectorizer.fit_transform(list(cv_texts) + list(jd_texts))
+    cv_matrix, jd_matrix = matrix[:len(cv_texts)], matrix[len(cv_texts):]
+    return linear_kernel(cv_matrix, jd_matrix).max(axis=1)
+
+def select_candidates(similarities, top_k=None, threshold=None):
+    # threshold là ngưỡng sàn, top_k là số lượng tối đa; đặt cả hai thì áp dụng cả hai
+    keep = np.ones(len(similarities), dtype=bool)
+    if threshold is not None:
+        keep &= similarities >= threshold
+    if top_k:
+        top = np.zeros(len(similarities), dtype=bool)
+        top[np.argsort(-similarities, kind='stable')[:top_k]] = True
+        keep &= top
+    return keep
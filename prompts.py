@@ -0,0 +1,168 @@
+import re
+from functools import lru_cache
+
+from config import CV_TOKEN_BUDGET, TOKENIZER_ENCODING
+
+RUBRIC_TEXT = """
+Điểm trừ ( mỗi tiêu chí +5 điểm) nếu hồ sơ có các điểm sau :
+1.	Thiếu kinh nghiệm: Không có đủ kinh nghiệm làm việc liên quan đến vị trí ứng tuyển cho các vị trí nhân viên trở lên.
+2.	Lỗi chính tả và ngữ pháp: Hồ sơ có nhiều lỗi chính tả hoặc ngữ pháp, thể hiện sự thiếu cẩn thận.
+3.	Thời gian nghỉ việc dài: Có khoảng thời gian dài không làm việc mà không có lý do rõ ràng.
+4.	Thay đổi công việc thường xuyên: Có nhiều lần thay đổi công việc trong thời gian ngắn, có thể gây lo ngại về tính ổn định.
+5.	Thiếu thông tin quan trọng: Hồ sơ không cung cấp đủ thông tin về quá trình học tập, kinh nghiệm làm việc hoặc kỹ năng.
+6.	Thiếu thông tin liên hệ: Không cung cấp thông tin liên lạc đầy đủ hoặc chính xác.
+7.	Không rõ ràng về mục tiêu nghề nghiệp: Mục tiêu nghề nghiệp không rõ ràng hoặc không phù hợp với vị trí ứng tuyển.
+8.	Thái độ không chuyên nghiệp: Sử dụng ngôn ngữ không phù hợp hoặc có những bình luận tiêu cực về công việc trước đây.
+
+Điểm cộng  ( Mỗi tiêu chí +5 điểm ) nếu hồ sơ thể hiện :
+1.	Kinh nghiệm làm việc phong phú: Có nhiều năm kinh nghiệm trong lĩnh vực liên quan hoặc trong các vị trí tương tự.
+2.	Kỹ năng chuyên môn mạnh: Sở hữu các kỹ năng chuyên môn cần thiết cho công việc, như kỹ năng phân tích, lập trình, hay quản lý dự án.
+3.	Chứng chỉ và bằng cấp phù hợp: Có các chứng chỉ và bằng cấp liên quan đến vị trí ứng tuyển, thể hiện sự cam kết trong nghề nghiệp.
+4.	Kỹ năng giao tiếp tốt:  Khả năng giao tiếp rõ ràng và hiệu quả, có thể làm việc với nhiều đối tượng khác nhau.
+5.	Thành tích nổi bật: Có thành tích đáng chú ý trong công việc trước đây, như tăng hiệu quả, cải thiện quy trình làm việc, hoặc dự án thành công.
+6.	Thái độ tích cực và chuyên nghiệp: Thể hiện sự nhiệt tình, trách nhiệm và thái độ tích cực trong công việc.
+"""
+
+# Những đoạn lặp lại trong CV không mang thông tin để chấm điểm
+BOILERPLATE_PATTERNS = [
+    r'\b(?:page|trang)\s*\d+\s*(?:/|of|trên)\s*\d+\b',
+    r'\breferences?\s+(?:are\s+)?available\s+(?:up)?on\s+request\b\.?',
+    r'\bcurriculum\s+vitae\b',
+    r'\bsơ\s+yếu\s+lý\s+lịch\b',
+    r'\btôi\s+xin\s+cam\s+(?:đoan|kết)\b[^.]*\.?',
+    r'\bi\s+hereby\s+(?:declare|certify)\b[^.]*\.?',
+]
+_boilerplate_re = re.compile('|'.join(BOILERPLATE_PATTERNS), re.IGNORECASE)
+_segment_re = re.compile(r'(?<=[.!?;•|])\s+')
+
+_encoding = None
+
+def _get_encoding():
+    # tiktoken tải bảng BPE ở lần dùng đầu tiên; nếu không tải được thì ước lượng ~4 ký tự/token
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception as e:
+            print(f"Không tải được tokenizer {TOKENIZER_ENCODING}, dùng ước lượng theo ký tự: {str(e)}")
+            _encoding = False
+    return _encoding
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+def truncate_tokens(text, budget):
+    encoding = _get_encoding()
+    if encoding:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:budget])
+    return text[:budget * 4]
+
+def compact_text(text, budget=CV_TOKEN_BUDGET):
+    # Chỉ rút gọn khi văn bản vượt ngân sách token: bỏ boilerplate, bỏ các đoạn lặp lại
+    # (header/footer mỗi trang, mục bị trùng), cuối cùng cắt theo số token.
+    if not text or count_tokens(text) <= budget:
+        return text
+    text = ' '.join(_boilerplate_re.sub(' ', text).split())
+    seen = set()
+    kept = []
+    for segment in _segment_re.split(text):
+        key = segment.lower()
+        if key in seen or not any(ch.isalnum() for ch in key):
+            continue
+        seen.add(key)
+        kept.append(segment)
+    text = ' '.join(kept)
+    if count_tokens(text) > budget:
+        text = truncate_tokens(text, budget)
+    return text
+
+
+def build_prompt2(jd2, cv_text):
+    return f"""
+    Bạn là một chuyên gia nhân sự và tuyển dụng. Hãy đánh giá CV dưới đây dựa trên mô tả công việc và cung cấp phản hồi chính xác theo schema JSON được định nghĩa.
+    Mô tả công việc:
+    {jd2}
+    CV:
+    {cv_text}
+    Vui lòng trả về kết quả đánh giá theo đúng schema JSON đã định nghĩa.
+    """
+
+def build_quick_prompt(jd2, cv_text):
+    # Lượt chấm nhanh ở tầng 1 (chế độ 'tiered'): prompt ngắn, CV đã được rút gọn hơn
+    return f"""
+    Bạn là chuyên gia tuyển dụng. Chấm nhanh mức độ phù hợp của CV với mô tả công việc theo schema JSON, tóm tắt trong một câu.
+    Mô tả công việc:
+    {jd2}
+    CV:
+    {cv_text}
+    """
+
+# Prompt có phần đứng trước và sau CV chỉ phụ thuộc JD: dựng sẵn một lần rồi ghép với từng CV
+def prompt1_parts(jd1):
+    return (f"""
+    Bạn là một chuyên gia nhân sự và tuyển dụng. Hãy đánh giá CV dưới đây dựa trên mô tả công việc và cung cấp phản hồi chính xác theo schema JSON được định nghĩa.
+    Mô tả công việc:
+    {jd1}
+    {RUBRIC_TEXT}
+    CV:
+    """, """
+
+    Vui lòng trả về kết quả đánh giá theo đúng schema JSON đã định nghĩa.
+    Chú ý: Các tiêu chí mà bạn không chắc hoặc không ghi rõ trong CV thì bạn sẽ +0 điểm.
+    """)
+
+@lru_cache(maxsize=64)
+def combined_prompt_parts(jd2, jd1):
+    return (f"""
+    Bạn là một chuyên gia nhân sự và tuyển dụng. Hãy đánh giá CV dưới đây theo hai phần và cung cấp phản hồi chính xác theo schema JSON được định nghĩa.
+
+    Phần "hard_skill": đánh giá CV dựa trên mô tả công việc sau:
+    {jd2}
+
+    Phần "soft_skill": đánh giá CV dựa trên tiêu chí sau:
+    {jd1}
+    {RUBRIC_TEXT}
+    CV:
+    """, """
+
+    Vui lòng trả về kết quả đánh giá theo đúng schema JSON đã định nghĩa.
+    Chú ý: Với phần "soft_skill", các tiêu chí mà bạn không chắc hoặc không ghi rõ trong CV thì bạn sẽ +0 điểm.
+    """)
+
+def build_combined_prompt(jd2, jd1, cv_text):
+    prefix, suffix = combined_prompt_parts(jd2, jd1)
+    return prefix + cv_text + suffix
+
+def build_batch_prompt(jd2, jd1, cvs):
+    # cvs: danh sách (mã ứng viên, nội dung CV). JD chỉ xuất hiện một lần cho cả nhóm CV.
+    cv_blocks = "\n".join(f"""
+    ### Mã ứng viên: {candidate_id}
+    {cv_text}
+    """ for candidate_id, cv_text in cvs)
+    if jd1 is None:
+        criteria = f"""
+    Mô tả công việc:
+    {jd2}"""
+        note = ""
+    else:
+        criteria = f"""
+    Phần "hard_skill": đánh giá CV dựa trên mô tả công việc sau:
+    {jd2}
+
+    Phần "soft_skill": đánh giá CV dựa trên tiêu chí sau:
+    {jd1}
+    {RUBRIC_TEXT}"""
+        note = """
+    Chú ý: Với phần "soft_skill", các tiêu chí mà bạn không chắc hoặc không ghi rõ trong CV thì bạn sẽ +0 điểm."""
+    return f"""
+    Bạn là một chuyên gia nhân sự và tuyển dụng. Dưới đây có {len(cvs)} CV, hãy đánh giá từng CV một cách độc lập và cung cấp phản hồi chính xác theo schema JSON được định nghĩa.
+    {criteria}
+
+    Danh sách CV:
+    {cv_blocks}
+    Vui lòng trả về đúng một phần tử trong "ket_qua" cho mỗi CV, với "ma_ung_vien" giữ nguyên mã ứng viên của CV đó.{note}
+    """
@@ -0,0 +1,72 @@
+import threading
+import time
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    # Gộp các lần gọi đồng thời cùng key: chỉ luồng đầu tiên chạy fn, các luồng đến sau chờ và dùng chung
+    # kết quả (hoặc lỗi). Key chỉ được giữ trong lúc đang chạy, lần gọi sau khi xong sẽ chạy lại fn.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        # Trả về (value, shared); shared là True khi kết quả lấy từ lần gọi của luồng khác
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+        try:
+            call.value = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value, False
+
+
+class TTLCache:
+    # Cache trong bộ nhớ dùng chung cho cả process, mỗi giá trị sống ttl giây.
+    # Các lần nạp đồng thời cùng key được gộp bằng SingleFlight; giá trị None không được cache.
+    def __init__(self, ttl, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._flight = SingleFlight()
+
+    def get_or_load(self, key, loader):
+        # Trả về (value, hit); hit là True khi không phải tự gọi loader
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1], True
+        value, shared = self._flight.do(key, loader)
+        if not shared and value is not None:
+            with self._lock:
+                if len(self._entries) >= self.max_entries:
+                    now = time.monotonic()
+                    self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                    if len(self._entries) >= self.max_entries:
+                        self._entries.pop(min(self._entries, key=lambda k: self._entries[k][0]))
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+        return value, shared
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,105 @@
+import io
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import RESULT_CHUNK_ROWS
+
+# Cột có ít giá trị khác nhau: ghi dạng category để Parquet lưu bằng dictionary encoding
+CATEGORICAL_COLUMNS = ['Vị trí', 'Đánh giá soft skill', 'Trạng thái']
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+# Cột của file kết quả (giống build_final_df) với kiểu cố định để mọi khối ghi ra có cùng schema
+_SCORE = pa.float64()
+RESULT_SCHEMA = pa.schema([
+    ('Mã ứng viên', pa.string()), ('Tên ứng viên', pa.string()), ('Email', pa.string()),
+    ('Trạng thái', pa.string()), ('Link CV', pa.string()), ('Mức lương mong muốn', pa.int64()),
+    ('Vị trí', pa.string()),
+    ('Trục Năng lực soft skill', _SCORE), ('Trục Phù hợp Văn hóa soft skill', _SCORE),
+    ('Trục Tương lai soft skill', _SCORE), ('Tiêu chí khác soft skill', _SCORE), ('Điểm cộng soft skill', _SCORE),
+    ('Điểm trừ soft skill', _SCORE), ('Điểm tổng quát soft skill', _SCORE), ('Đánh giá soft skill', pa.string()),
+    ('Tóm tắt soft skill', pa.string()),
+    ('Mức độ phù hợp hard skill', _SCORE), ('Kỹ năng kỹ thuật hard skill', _SCORE), ('Kinh nghiệm hard skill', _SCORE),
+    ('Trình độ học vấn hard skill', _SCORE), ('Kỹ năng mềm hard skill', _SCORE), ('Điểm tổng quát hard skill', _SCORE),
+    ('Tóm tắt hard skill', pa.string()),
+    ('Số token prompt', pa.int64()), ('Kết quả từ cache', pa.bool_()),
+    ('Độ tương đồng TF-IDF', pa.float64()), ('Trùng với ứng viên', pa.string()), ('Tầng chấm', pa.int64()),
+    ('Điểm ước lượng tầng 1', pa.float64()),
+])
+
+
+def results_to_csv(df):
+    # CSV UTF-8-SIG để Excel đọc đúng tiếng Việt
+    return df.to_csv(index=False).encode('utf-8-sig')
+
+def results_to_parquet(df):
+    # Parquet giữ nguyên kiểu dữ liệu (số, bool, category) nên khi đọc lại không phải suy luận hay làm sạch lại
+    df = df.copy()
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False, engine='pyarrow', compression='zstd')
+    return buffer.getvalue()
+
+class ResultWriter:
+    # Ghi kết quả xuống file Parquet theo từng khối cột (row group) chunk_rows dòng:
+    # bộ nhớ chỉ giữ một khối dù opening có bao nhiêu ứng viên
+    def __init__(self, path, chunk_rows=RESULT_CHUNK_ROWS):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.count = 0
+        self._rows = []
+        self._writer = pq.ParquetWriter(path, RESULT_SCHEMA, compression='zstd')
+
+    def append(self, row):
+        self._rows.append(row)
+        self.count += 1
+        if len(self._rows) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if self._rows:
+            self._writer.write_table(pa.Table.from_pylist(self._rows, schema=RESULT_SCHEMA))
+            self._rows = []
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+def read_preview(path, rows):
+    # rows dòng đầu của file kết quả, chỉ đọc các row group cần thiết
+    batches = pq.ParquetFile(path).iter_batches(batch_size=rows)
+    return next(batches, pa.RecordBatch.from_pylist([], schema=RESULT_SCHEMA)).to_pandas()
+
+def parquet_to_csv(path, csv_path=None):
+    # Chuyển file kết quả Parquet sang CSV UTF-8-SIG theo từng row group, không nạp cả file vào bộ nhớ
+    csv_path = csv_path or os.path.splitext(path)[0] + '.csv'
+    parquet = pq.ParquetFile(path)
+    with open(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
+        if parquet.num_row_groups == 0:
+            pd.DataFrame(columns=parquet.schema_arrow.names).to_csv(f, index=False)
+        for i in range(parquet.num_row_groups):
+            parquet.read_row_group(i).to_pandas().to_csv(f, index=False, header=i == 0)
+    return csv_path
+
+def is_parquet(name):
+    return str(name).lower().endswith(PARQUET_EXTENSIONS)
+
+def read_results(file, name=None, columns=None):
+    # Đọc file kết quả CSV hoặc Parquet. columns: chỉ đọc các cột cần dùng (cột không có trong file được bỏ qua).
+    name = name or getattr(file, 'name', '')
+    if is_parquet(name):
+        if columns is not None:
+            available = set(pq.read_schema(file).names)
+            columns = [column for column in columns if column in available]
+            if hasattr(file, 'seek'):
+                file.seek(0)
+        return pd.read_parquet(file, engine='pyarrow', columns=columns)
+    if columns is None:
+        return pd.read_csv(file)
+    wanted = set(columns)
+    return pd.read_csv(file, usecols=lambda column: column in wanted)
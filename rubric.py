@@ -0,0 +1,70 @@
+import os
+import threading
+
+import numpy as np
+
+from config import JD_CSV_PATH
+from prompts import prompt1_parts
+
+NO_POSITION = "Chưa sắp xếp được vị trí"
+RUBRIC_COLUMNS = ['Position', 'Job_Description', 'min_salary', 'pass_threshold']
+
+_rubric = None
+_rubric_lock = threading.Lock()
+
+
+class Rubric:
+    # Bảng tiêu chí biên dịch từ JD_tc.csv: mỗi dòng là một vị trí với mức lương tối thiểu (min_salary)
+    # và điểm đạt (pass_threshold). Mốc lương được sắp xếp tăng dần để xếp vị trí bằng np.searchsorted;
+    # phần prompt1 trước/sau CV của từng vị trí được dựng sẵn. Thêm vị trí chỉ cần thêm một dòng vào CSV.
+    def __init__(self, jd_df):
+        missing = [column for column in RUBRIC_COLUMNS if column not in jd_df.columns]
+        if missing:
+            raise ValueError(f"File tiêu chí thiếu cột: {', '.join(missing)}")
+        jd_df = jd_df.sort_values('min_salary', kind='stable').reset_index(drop=True)
+        self.positions = jd_df['Position'].tolist()
+        self.descriptions = jd_df['Job_Description'].tolist()
+        self.breakpoints = jd_df['min_salary'].to_numpy(dtype=float)
+        self.thresholds = jd_df['pass_threshold'].to_numpy(dtype=float)
+        self.prompt1_parts = [prompt1_parts(description) for description in self.descriptions]
+
+    def bucket(self, salaries):
+        # Chỉ số vị trí cho cả mảng mức lương trong một lượt; -1 khi không có mức lương (<= 0).
+        # Lương thấp hơn mốc nhỏ nhất vẫn được xếp vào vị trí đầu tiên.
+        salaries = np.asarray(salaries, dtype=float)
+        index = np.maximum(np.searchsorted(self.breakpoints, salaries, side='right') - 1, 0)
+        return np.where(salaries > 0, index, -1)
+
+    def pass_fail(self, index, score):
+        # "Pass" khi điểm đạt ngưỡng của vị trí, "N/A" khi chưa có vị trí
+        if index < 0:
+            return "N/A"
+        return "Pass" if score >= self.thresholds[index] else "Fail"
+
+    def position(self, index):
+        return self.positions[index] if index >= 0 else NO_POSITION
+
+    def description(self, index):
+        return self.descriptions[index] if index >= 0 else None
+
+    def build_prompt1(self, index, cv_text):
+        prefix, suffix = self.prompt1_parts[index]
+        return prefix + cv_text + suffix
+
+
+def load_rubric(path=JD_CSV_PATH):
+    # Biên dịch một lần cho mỗi process và biên dịch lại khi file bị sửa
+    import pandas as pd
+    global _rubric
+    key = (path, os.path.getmtime(path))
+    with _rubric_lock:
+        if _rubric is None or _rubric[0] != key:
+            _rubric = (key, Rubric(pd.read_csv(path)))
+        return _rubric[1]
+
+def position_index(row, rubric):
+    # Chỉ số vị trí đã được tính theo cả trang ứng viên ở pipeline.process_data; tính lại nếu chưa có
+    index = row.get('position_index')
+    if index is None:
+        index = int(rubric.bucket(row.get('expect_salary', -1)))
+    return int(index)
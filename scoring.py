@@ -0,0 +1,462 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from config import (CV_TOKEN_BUDGET, GEMINI_API_ENDPOINT, GEMINI_BACKOFF_BASE, GEMINI_BACKOFF_MAX,
+                    GEMINI_BATCH_MAX_CVS, GEMINI_BATCH_TOKEN_BUDGET, GEMINI_MAX_IN_FLIGHT, GEMINI_MAX_RETRIES,
+                    GEMINI_MODEL, GEMINI_MODEL_CASCADE, GEMINI_RPM, GEMINI_TPM, SCORING_MODE, TIER1_CV_TOKEN_BUDGET,
+                    TIER_MARGIN, cleaned_schema, combined_schema, new_schema)
+from metrics import optional_timer
+from prompts import (build_batch_prompt, build_combined_prompt, build_prompt2, build_quick_prompt, compact_text,
+                     count_tokens)
+from resources import SingleFlight
+from rubric import NO_POSITION, position_index
+
+# Tên lớp lỗi trong google.api_core.exceptions; module chỉ được nạp khi thật sự có lỗi
+RETRYABLE_ERRORS = ('TooManyRequests', 'ResourceExhausted', 'InternalServerError', 'BadGateway',
+                    'ServiceUnavailable', 'GatewayTimeout', 'DeadlineExceeded')
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+TIER_COLUMN = 'Tầng chấm'
+ESTIMATE_COLUMN = 'Điểm ước lượng tầng 1'
+TIER1_VERDICT_SUFFIX = ' (tầng 1)'  # "Pass (tầng 1)"/"Fail (tầng 1)": kết luận chỉ dựa trên điểm ước lượng tầng 1
+
+_gemini_config = None
+_genai = None
+_genai_lock = threading.Lock()
+_models = {}  # (model_name, schema) -> GenerativeModel dùng chung cho mọi job/session trong process
+_score_flight = SingleFlight()
+
+
+def configure_gemini(api_key, endpoint=GEMINI_API_ENDPOINT):
+    # Chỉ ghi lại cấu hình: google.generativeai mất gần một giây để import nên được nạp ở lần gọi Gemini đầu tiên.
+    # GEMINI_API_ENDPOINT cho phép trỏ tới một server Gemini giả lập chạy local (REST)
+    global _gemini_config, _genai
+    with _genai_lock:
+        if (api_key, endpoint) != _gemini_config:
+            _gemini_config = (api_key, endpoint)
+            _genai = None
+            _models.clear()
+
+def _get_genai():
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            import google.generativeai as genai
+            api_key, endpoint = _gemini_config or (None, GEMINI_API_ENDPOINT)
+            if endpoint:
+                genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": endpoint})
+            else:
+                genai.configure(api_key=api_key)
+            _genai = genai
+        return _genai
+
+def get_model(model_name, schema):
+    # Tạo GenerativeModel một lần cho mỗi cặp model/schema thay vì ở mỗi lần gọi Gemini
+    key = (model_name, json.dumps(schema, sort_keys=True, ensure_ascii=False))
+    genai = _get_genai()
+    with _genai_lock:
+        model = _models.get(key)
+        if model is None:
+            model = _models[key] = genai.GenerativeModel(model_name, generation_config={
+                "response_mime_type": "application/json",
+                "response_schema": schema
+            })
+        return model
+
+
+class TokenBucket:
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+class RateLimiter:
+    # Giới hạn đồng thời số request/phút và số token/phút theo quota của API key
+    def __init__(self, rpm=GEMINI_RPM, tpm=GEMINI_TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    def acquire(self, tokens):
+        self.requests.acquire(1)
+        self.tokens.acquire(tokens)
+
+
+def is_retryable(error):
+    from google.api_core import exceptions as google_exceptions
+    if isinstance(error, tuple(getattr(google_exceptions, name) for name in RETRYABLE_ERRORS)):
+        return True
+    return getattr(error, 'code', None) in RETRYABLE_STATUS
+
+def backoff_delay(attempt):
+    # Exponential backoff với full jitter
+    return random.uniform(0, min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * (2 ** attempt)))
+
+def response_tokens(response):
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None and getattr(usage, 'candidates_token_count', None):
+        return usage.candidates_token_count
+    return count_tokens(response.text)
+
+def generate_json(prompt, schema, limiter, model_name=GEMINI_MODEL, prompt_tokens=None, metrics=None, key=None):
+    model = get_model(model_name, schema)
+    if prompt_tokens is None:
+        prompt_tokens = count_tokens(prompt)
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        with optional_timer(metrics, 'rate_limit_wait_s', key):
+            limiter.acquire(prompt_tokens)
+        try:
+            with optional_timer(metrics, 'gemini_call_s', key):
+                response = model.generate_content(prompt)
+            if metrics is not None:
+                metrics.incr('gemini_calls')
+                metrics.observe('prompt_tokens', prompt_tokens, key)
+                metrics.observe('response_tokens', response_tokens(response), key)
+            return json.loads(response.text)
+        except Exception as e:
+            if attempt == GEMINI_MAX_RETRIES or not is_retryable(e):
+                raise
+            if metrics is not None:
+                metrics.incr('gemini_retries')
+            time.sleep(backoff_delay(attempt))
+
+def _sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def score_cache_key(cv_text, jd_text, schema, model_name=GEMINI_MODEL):
+    # Đổi CV, JD, schema hoặc model đều cho ra key mới nên cache tự mất hiệu lực
+    schema_text = json.dumps(schema, sort_keys=True, ensure_ascii=False)
+    return _sha256('|'.join([_sha256(cv_text), _sha256(jd_text), _sha256(schema_text), model_name]))
+
+def cached_generate_json(prompt, schema, limiter, cv_text, jd_text, score_cache=None, metrics=None, key=None,
+                         model_name=GEMINI_MODEL):
+    # Trả về (response, prompt_tokens); prompt_tokens = 0 khi kết quả lấy từ cache hoặc từ lần gọi
+    # đồng thời của job khác với cùng CV, JD và schema (chỉ một request được gửi lên Gemini)
+    cache_key = score_cache_key(cv_text, jd_text, schema, model_name)
+
+    def load():
+        if score_cache is not None:
+            cached = score_cache.get(cache_key)
+            if cached is not None:
+                return cached, 0
+        prompt_tokens = count_tokens(prompt)
+        response = generate_json(prompt, schema, limiter, model_name, prompt_tokens=prompt_tokens, metrics=metrics,
+                                 key=key)
+        if score_cache is not None:
+            score_cache.put(cache_key, response)
+        return response, prompt_tokens
+
+    (response, prompt_tokens), shared = _score_flight.do(cache_key, load)
+    if shared:
+        if metrics is not None:
+            metrics.incr('gemini_coalesced')
+        return response, 0
+    return response, prompt_tokens
+
+
+NO_SALARY_RESPONSE = {
+    "truc_nang_luc": 0,
+    "truc_van_hoa": 0,
+    "truc_tuong_lai": 0,
+    "tieu_chi_khac": 0,
+    "diem_cong": 0,
+    "diem_tru": 0,
+    "tom_tat": "Không có mức lương kỳ vọng, chỉ đánh giá kỹ năng chung"
+}
+
+# Ứng viên chỉ được chấm nhanh ở tầng 1 (chế độ 'tiered'): không có điểm chi tiết theo tiêu chí
+QUICK_SOFT_RESPONSE = dict(dict.fromkeys(cleaned_schema["required"]),
+                           tom_tat="Chỉ chấm nhanh ở tầng 1 vì kết quả cách xa ngưỡng đạt, không chấm chi tiết theo tiêu chí "
+                                   "(xem cột điểm ước lượng tầng 1)")
+
+def hard_skill_score(response2):
+    return round((response2["muc_do_phu_hop"] + response2["ky_nang_ky_thuat"] + response2["kinh_nghiem"] + response2["trinh_do_hoc_van"] + response2["ky_nang_mem"])/5, 2)
+
+def soft_skill_score(response1):
+    return response1["truc_nang_luc"] + response1["truc_van_hoa"] + response1["truc_tuong_lai"] + response1["tieu_chi_khac"] + response1["diem_cong"] - response1["diem_tru"]
+
+def evaluate_candidate(row, cv_text, jd2, rubric, limiter, mode=SCORING_MODE, score_cache=None, metrics=None):
+    with optional_timer(metrics, 'score_s', row['id']):
+        return _evaluate_candidate(row, cv_text, jd2, rubric, limiter, mode, score_cache, metrics)
+
+def _evaluate_candidate(row, cv_text, jd2, rubric, limiter, mode, score_cache, metrics):
+    index = position_index(row, rubric)
+    # CV chỉ xuất hiện một lần trong mỗi prompt và được rút gọn về CV_TOKEN_BUDGET
+    cv_text = compact_text(cv_text)
+
+    if index >= 0:
+        # If salary is specified, evaluate the rubric part too and assign position
+        jd1 = rubric.description(index)
+        if mode == 'separate':
+            response2, tokens2 = cached_generate_json(build_prompt2(jd2, cv_text), new_schema,
+                                                      limiter, cv_text, jd2, score_cache, metrics, row['id'])
+            response1, tokens1 = cached_generate_json(rubric.build_prompt1(index, cv_text), cleaned_schema,
+                                                      limiter, cv_text, jd1, score_cache, metrics, row['id'])
+            prompt_tokens = tokens2 + tokens1
+        else:
+            response, prompt_tokens = cached_generate_json(build_combined_prompt(jd2, jd1, cv_text), combined_schema,
+                                                           limiter, cv_text, jd2 + jd1, score_cache, metrics, row['id'])
+            response1, response2 = response["soft_skill"], response["hard_skill"]
+    else:
+        # If no salary is specified, only the hard-skill call is made and no position is assigned
+        response2, prompt_tokens = cached_generate_json(build_prompt2(jd2, cv_text), new_schema,
+                                                        limiter, cv_text, jd2, score_cache, metrics, row['id'])
+        response1 = None
+    return candidate_result(row, rubric, response1, response2, prompt_tokens,
+                            score_cache is not None and prompt_tokens == 0)
+
+def evaluate_tiered(row, cv_text, jd2, rubric, limiter, score_cache=None, metrics=None, cascade=GEMINI_MODEL_CASCADE,
+                    margin=TIER_MARGIN):
+    with optional_timer(metrics, 'score_s', row['id']):
+        return _evaluate_tiered(row, cv_text, jd2, rubric, limiter, score_cache, metrics, cascade, margin)
+
+def _evaluate_tiered(row, cv_text, jd2, rubric, limiter, score_cache, metrics, cascade, margin):
+    # Tầng 1: prompt ngắn với new_schema trên model đầu tiên của cascade. Điểm hard skill (0-10) x 10 là ước lượng
+    # điểm để so với ngưỡng đạt của vị trí; chỉ khi ước lượng cách ngưỡng không quá margin thì mới chấm đủ tiêu chí
+    # (cleaned_schema) bằng model tầng sau, lặp lại cho đến khi kết quả rõ ràng hoặc hết model.
+    # Ước lượng không phải điểm theo tiêu chí nên được ghi vào cột riêng; ứng viên không được chấm đủ tiêu chí có
+    # 'Đánh giá soft skill' là "Pass (tầng 1)"/"Fail (tầng 1)" theo ước lượng so với ngưỡng đạt.
+    cascade = list(cascade) or [GEMINI_MODEL]
+    if len(cascade) < 2:
+        cascade *= 2  # Chỉ có một model: tầng 1 và phần chấm đủ tiêu chí dùng cùng model
+    index = position_index(row, rubric)
+    cv_text = compact_text(cv_text)
+    quick_cv = compact_text(cv_text, TIER1_CV_TOKEN_BUDGET)
+    # Thêm tiền tố vào JD của key cache để lượt chấm nhanh không trùng key với prompt2 đầy đủ
+    response2, prompt_tokens = cached_generate_json(build_quick_prompt(jd2, quick_cv), new_schema, limiter, quick_cv,
+                                                    'quick|' + jd2, score_cache, metrics, row['id'], cascade[0])
+    estimate = round(hard_skill_score(response2) * 10, 2)
+    response1, score, tier = None, estimate, 1
+    if index >= 0:
+        threshold = rubric.thresholds[index]
+        for model_name in cascade[1:]:
+            if abs(score - threshold) > margin:
+                break
+            tier += 1
+            if metrics is not None:
+                metrics.incr('tier_escalations')
+            response1, tokens = cached_generate_json(rubric.build_prompt1(index, cv_text), cleaned_schema, limiter,
+                                                     cv_text, rubric.description(index), score_cache, metrics,
+                                                     row['id'], model_name)
+            prompt_tokens += tokens
+            score = soft_skill_score(response1)
+    from_cache = score_cache is not None and prompt_tokens == 0
+    if response1 is None and index >= 0:
+        uv = build_result(row, rubric.position(index), QUICK_SOFT_RESPONSE, response2, None,
+                          rubric.pass_fail(index, estimate) + TIER1_VERDICT_SUFFIX, prompt_tokens, from_cache)
+    else:
+        uv = candidate_result(row, rubric, response1, response2, prompt_tokens, from_cache)
+    uv[TIER_COLUMN] = tier
+    uv[ESTIMATE_COLUMN] = estimate
+    if metrics is not None:
+        metrics.incr(f'tier{tier}_final')
+    return uv
+
+def candidate_result(row, rubric, response1, response2, prompt_tokens, from_cache):
+    index = position_index(row, rubric)
+    if index >= 0:
+        position = rubric.position(index)
+        main_criteria_score = soft_skill_score(response1)
+        pass_fail = rubric.pass_fail(index, main_criteria_score)
+    else:
+        position = NO_POSITION
+        response1 = NO_SALARY_RESPONSE
+        main_criteria_score = 0
+        pass_fail = "N/A"
+    return build_result(row, position, response1, response2, main_criteria_score, pass_fail,
+                        prompt_tokens, from_cache)
+
+def build_result(row, position, response1, response2, main_criteria_score, pass_fail, prompt_tokens, from_cache):
+    return {
+        'Mã ứng viên': str(row['id']),
+        'Tên ứng viên': row['name'],
+        'Vị trí': position,
+        'Trục Năng lực soft skill': response1["truc_nang_luc"],
+        'Trục Phù hợp Văn hóa soft skill': response1["truc_van_hoa"],
+        'Trục Tương lai soft skill': response1["truc_tuong_lai"],
+        'Tiêu chí khác soft skill': response1["tieu_chi_khac"],
+        'Điểm cộng soft skill': response1["diem_cong"],
+        'Điểm trừ soft skill': response1["diem_tru"],
+        'Điểm tổng quát soft skill': main_criteria_score,
+        'Đánh giá soft skill': pass_fail,
+        'Tóm tắt soft skill': response1["tom_tat"],
+        'Mức độ phù hợp hard skill': response2["muc_do_phu_hop"],
+        'Kỹ năng kỹ thuật hard skill': response2["ky_nang_ky_thuat"],
+        'Kinh nghiệm hard skill': response2["kinh_nghiem"],
+        'Trình độ học vấn hard skill': response2["trinh_do_hoc_van"],
+        'Kỹ năng mềm hard skill': response2["ky_nang_mem"],
+        'Điểm tổng quát hard skill': hard_skill_score(response2),
+        'Tóm tắt hard skill': response2["tom_tat"],
+        'Số token prompt': prompt_tokens,
+        'Kết quả từ cache': from_cache
+    }
+
+def screened_out_result(row, rubric):
+    # Ứng viên bị loại ở vòng lọc TF-IDF: không gọi Gemini, mọi điểm bằng 0
+    position = rubric.position(position_index(row, rubric))
+    summary = "Không được chấm bằng Gemini do độ tương đồng với JD thấp ở vòng lọc sơ bộ"
+    response1 = dict(NO_SALARY_RESPONSE, tom_tat=summary)
+    response2 = {key: 0 for key in ["muc_do_phu_hop", "ky_nang_ky_thuat", "kinh_nghiem", "trinh_do_hoc_van", "ky_nang_mem"]}
+    response2["tom_tat"] = summary
+    return build_result(row, position, response1, response2, 0, "Loại sơ bộ", 0, False)
+
+
+def batch_schema(item_schema):
+    # Schema mảng cho request gộp: mỗi phần tử là kết quả của một CV kèm mã ứng viên để ghép lại
+    return {
+        "type": "object",
+        "properties": {
+            "ket_qua": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": dict(item_schema["properties"], ma_ung_vien={
+                        "type": "string",
+                        "description": "Mã ứng viên của CV được đánh giá, giữ nguyên như trong đề bài."
+                    }),
+                    "required": ["ma_ung_vien"] + item_schema["required"]
+                }
+            }
+        },
+        "required": ["ket_qua"]
+    }
+
+def matches_schema(value, schema):
+    # Phản hồi gộp có thể thiếu hoặc sai trường ở từng phần tử nên kiểm tra lại trước khi dùng
+    if schema["type"] == "object":
+        return isinstance(value, dict) and all(
+            key in value and matches_schema(value[key], schema["properties"][key]) for key in schema["required"])
+    if schema["type"] == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if schema["type"] == "string":
+        return isinstance(value, str)
+    return True
+
+def batch_key(row, rubric):
+    # Các CV trong một request gộp phải dùng chung JD tiêu chí, tức cùng vị trí (-1: không có mức lương)
+    return position_index(row, rubric)
+
+def batch_cvs(cvs, rubric, token_budget=GEMINI_BATCH_TOKEN_BUDGET, max_cvs=GEMINI_BATCH_MAX_CVS):
+    # Gom (row, cv_text) thành từng nhóm theo khoảng lương, mỗi nhóm không vượt ngân sách token và số CV
+    groups = {}
+    for row, cv_text in cvs:
+        key = batch_key(row, rubric)
+        tokens = min(count_tokens(cv_text), CV_TOKEN_BUDGET)
+        batch, batch_tokens = groups.get(key, ([], 0))
+        if batch and (batch_tokens + tokens > token_budget or len(batch) >= max_cvs):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append((row, cv_text))
+        groups[key] = (batch, batch_tokens + tokens)
+    for batch, _ in groups.values():
+        if batch:
+            yield batch
+
+def evaluate_batch(batch, jd2, rubric, limiter, score_cache=None, metrics=None):
+    # Chấm một nhóm CV cùng khoảng lương bằng một request. Trả về (danh sách (row, uv, error), cảnh báo hoặc None);
+    # CV bị thiếu hoặc sai định dạng trong phản hồi được chấm lại từng CV bằng evaluate_candidate.
+    jd1 = rubric.description(position_index(batch[0][0], rubric))
+    schema = combined_schema if jd1 is not None else new_schema
+    jd_text = jd2 + jd1 if jd1 is not None else jd2
+
+    responses = {}
+    pending = []
+    warning = None
+    for row, cv_text in batch:
+        cv_text = compact_text(cv_text)
+        key = score_cache_key(cv_text, jd_text, schema)
+        cached = score_cache.get(key) if score_cache is not None else None
+        if cached is not None:
+            responses[str(row['id'])] = (cached, 0)
+        else:
+            pending.append((row, cv_text, key))
+
+    if len(pending) > 1:
+        prompt = build_batch_prompt(jd2, jd1, [(str(row['id']), cv_text) for row, cv_text, _ in pending])
+        prompt_tokens = count_tokens(prompt)
+        try:
+            with optional_timer(metrics, 'batch_score_s'):
+                response = generate_json(prompt, batch_schema(schema), limiter, prompt_tokens=prompt_tokens,
+                                         metrics=metrics)
+            items = {str(item.get("ma_ung_vien")): item for item in response.get("ket_qua", []) if isinstance(item, dict)}
+        except Exception as e:
+            if metrics is not None:
+                metrics.incr('batch_fallbacks')
+            warning = f"⚠️ Request gộp {len(pending)} CV lỗi, chuyển sang chấm từng CV: {str(e)}"
+            items = {}
+        missing = []
+        for row, cv_text, key in pending:
+            item = items.get(str(row['id']))
+            if not matches_schema(item, schema):
+                missing.append(str(row['id']))
+                continue
+            item = {field: item[field] for field in schema["properties"]}
+            responses[str(row['id'])] = (item, prompt_tokens // len(pending))
+            if score_cache is not None:
+                score_cache.put(key, item)
+        if missing and warning is None:
+            warning = (f"⚠️ Phản hồi gộp thiếu hoặc sai định dạng kết quả của {len(missing)}/{len(pending)} CV "
+                       f"(mã ứng viên: {', '.join(missing)}), chấm lại từng CV.")
+
+    results = []
+    for row, cv_text in batch:
+        if str(row['id']) not in responses:
+            try:
+                uv = evaluate_candidate(row, cv_text, jd2, rubric, limiter, 'combined', score_cache, metrics)
+                results.append((row, uv, None))
+            except Exception as e:
+                results.append((row, None, e))
+            continue
+        response, prompt_tokens = responses[str(row['id'])]
+        if jd1 is not None:
+            response1, response2 = response["soft_skill"], response["hard_skill"]
+        else:
+            response1, response2 = None, response
+        results.append((row, candidate_result(row, rubric, response1, response2, prompt_tokens,
+                                              prompt_tokens == 0), None))
+    return results, warning
+
+
+class ScoringEngine:
+    # Giữ tối đa max_in_flight CV đang được chấm cùng lúc; RateLimiter quyết định tốc độ thực tế
+    def __init__(self, max_in_flight=GEMINI_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight)
+
+    def score_stream(self, items, fn):
+        # items: iterable các tuple tham số cho fn. Trả về (item, result, error) theo thứ tự hoàn thành.
+        pending = {}
+        for item in items:
+            pending[self._pool.submit(fn, *item)] = item
+            while len(pending) >= self.max_in_flight:
+                yield from self._drain(pending)
+        while pending:
+            yield from self._drain(pending)
+
+    def _drain(self, pending):
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            item = pending.pop(future)
+            error = future.exception()
+            yield item, (None if error else future.result()), error
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)